@@ -17,6 +17,10 @@ def create_app(config_class=Config):
     # Ensure upload and processed folders exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['CHECKPOINT_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['DETECTION_CACHE_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['PREVIEW_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['PROGRESS_FOLDER'], exist_ok=True)
 
     # Register blueprints
     from app.routes import main
@@ -0,0 +1,222 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+def probe_video(path):
+    """Read frame count, resolution and frame rate from the container header, without decoding"""
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f'Cannot open video: {os.path.basename(path)}')
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = capture.get(cv2.CAP_PROP_FPS)
+    finally:
+        capture.release()
+
+    if frames <= 0 or width <= 0 or height <= 0:
+        raise ValueError(f'Invalid video file: {os.path.basename(path)}')
+    return {'frames': frames, 'width': width, 'height': height, 'fps': fps}
+
+def scheduler_in_use():
+    """Whether jobs run through the scheduler (the cascade bypasses it)"""
+    return Config.SCHEDULER_ENABLED and not Config.CASCADE_ENABLED
+
+def job_slots():
+    """Jobs run at once: one, or SCHEDULER_MAX_JOBS sharing the model through the scheduler
+
+    Without the scheduler every job calls the shared model objects directly,
+    and they are not safe to use from several threads at once.
+    """
+    return max(1, Config.SCHEDULER_MAX_JOBS) if scheduler_in_use() else 1
+
+def job_model_name():
+    """Name of the model(s) new jobs will run with"""
+    if Config.CASCADE_ENABLED:
+        return 'cascade'
+    return os.path.basename(Config.MODEL_PATH)
+
+def fit_line(points):
+    """Least squares y = a + b*x, with both terms kept non-negative"""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        # A single resolution: the cost scales with the pixel count
+        return 0.0, mean_y / mean_x if mean_x else 0.0
+    b = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x)
+    return max(0.0, mean_y - b * mean_x), b
+
+class ThroughputModel:
+    """Seconds per frame of each model as a function of the resolution
+
+    Fitted from the last ADMISSION_HISTORY jobs in JOB_STATS_FILE as
+    seconds_per_frame = a + b * megapixels, so the fixed cost of inference
+    and the per-pixel cost of decoding and encoding are both accounted for.
+    """
+
+    def __init__(self, stats_file=None):
+        self.stats_file = stats_file or Config.JOB_STATS_FILE
+        self.loaded_mtime = None
+        self.fits = {}
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.stats_file)
+        except OSError:
+            self.fits = {}
+            return
+        if mtime == self.loaded_mtime:
+            return
+
+        points = {}
+        with open(self.stats_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    width, height = (int(value) for value in record['resolution'].split('x'))
+                    fps = float(record['fps'])
+                except (ValueError, KeyError):
+                    continue
+                if fps <= 0:
+                    continue
+                # Jobs recorded before the model name was stored
+                model = record.get('model') or ('cascade' if 'cascade' in record else os.path.basename(Config.MODEL_PATH))
+                points.setdefault(model, []).append((width * height / 1e6, 1 / fps))
+
+        self.fits = {
+            model: fit_line(model_points[-Config.ADMISSION_HISTORY:])
+            for model, model_points in points.items()
+        }
+        self.loaded_mtime = mtime
+
+    def seconds_per_frame(self, model, width, height):
+        """Estimated processing time of one frame"""
+        self._reload()
+        if model not in self.fits:
+            return 1 / Config.ADMISSION_DEFAULT_FPS
+        a, b = self.fits[model]
+        return a + b * width * height / 1e6
+
+class AdmissionController:
+    """Admit, defer or reject jobs based on the estimated backlog
+
+    Each job's cost is estimated from a probe of its video and the
+    historical throughput of the model. A job is admitted while the work
+    ahead of it, spread over the job slots, plus its own cost fits in
+    ADMISSION_MAX_BACKLOG seconds. The ETA is the time to finish the work
+    queued ahead of the job plus the job itself.
+    """
+
+    def __init__(self, slots=None, max_backlog=None, throughput=None):
+        self.slots = slots or job_slots()
+        self.max_backlog = Config.ADMISSION_MAX_BACKLOG if max_backlog is None else max_backlog
+        self.throughput = throughput or ThroughputModel()
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+
+    def estimate(self, path):
+        """Probe a video and estimate its processing time"""
+        probe = probe_video(path)
+        model = job_model_name()
+        seconds = probe['frames'] * self.throughput.seconds_per_frame(model, probe['width'], probe['height'])
+        return {**probe, 'model': model, 'seconds': seconds}
+
+    def _remaining(self, job, now):
+        if job['started'] is None:
+            return job['seconds']
+        return max(0.0, job['seconds'] - (now - job['started']))
+
+    def backlog(self, now=None):
+        """Estimated seconds until every admitted job is done"""
+        now = now or time.time()
+        return sum(self._remaining(job, now) for job in self.jobs.values()) / self.slots
+
+    def admit(self, job_id, path, force=False):
+        """Decide whether to take a job, returns the decision and its ETA"""
+        estimate = self.estimate(path)
+        now = time.time()
+        with self.lock:
+            ahead = self.backlog(now)
+            eta = ahead + estimate['seconds']
+            decision = {
+                'estimated_seconds': round(estimate['seconds'], 1),
+                'frames': estimate['frames'],
+                'resolution': f"{estimate['width']}x{estimate['height']}",
+                'model': estimate['model']
+            }
+
+            # An empty queue always takes the job, however long
+            if not force and self.max_backlog > 0 and self.jobs and eta > self.max_backlog:
+                retry_after = math.ceil(max(1.0, eta - self.max_backlog))
+                logger.info(f'Deferring {job_id}: backlog {ahead:.0f}s, retry in {retry_after}s')
+                return {**decision, 'admitted': False, 'retry_after': retry_after}
+
+            queue_position = sum(1 for job in self.jobs.values() if job['started'] is None)
+            self.jobs[job_id] = {'seconds': estimate['seconds'], 'admitted': now, 'started': None}
+
+        logger.info(f"Admitted {job_id}: ~{estimate['seconds']:.0f}s of work, ETA {eta:.0f}s")
+        return {
+            **decision,
+            'admitted': True,
+            'queue_position': queue_position,
+            'eta_seconds': round(eta, 1)
+        }
+
+    def start(self, job_id):
+        """Mark an admitted job as running"""
+        with self.lock:
+            if job_id in self.jobs:
+                self.jobs[job_id]['started'] = time.time()
+
+    def finish(self, job_id):
+        """Remove a finished (or failed) job"""
+        with self.lock:
+            self.jobs.pop(job_id, None)
+
+    def snapshot(self):
+        """Jobs in the queue with their ETA"""
+        now = time.time()
+        with self.lock:
+            queue = []
+            ahead = 0.0
+            for job_id, job in self.jobs.items():
+                remaining = self._remaining(job, now)
+                queue.append({
+                    'job': job_id,
+                    'running': job['started'] is not None,
+                    'remaining_seconds': round(remaining, 1),
+                    'eta_seconds': round(ahead / self.slots + remaining, 1)
+                })
+                ahead += remaining
+            return {'slots': self.slots, 'backlog_seconds': round(ahead / self.slots, 1), 'jobs': queue}
+
+admission = None
+_admission_lock = threading.Lock()
+
+def get_admission():
+    """Get the admission controller of the process running the jobs"""
+    global admission
+    with _admission_lock:
+        if admission is None:
+            admission = AdmissionController()
+    return admission
+
+def admit_job(job_id, path, force=False):
+    """Admission decision for a new job; unreadable videos are refused with an error"""
+    try:
+        return get_admission().admit(job_id, path, force=force)
+    except ValueError as e:
+        logger.error(f'Refusing {job_id}: {str(e)}')
+        return {'admitted': False, 'error': str(e)}
@@ -0,0 +1,142 @@
+import time
+import logging
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+def pig_boxes(result):
+    """Get the boxes and confidences of the selected classes in a YOLO result"""
+    import numpy as np
+
+    class_id = result.boxes.cls.cpu().numpy().astype(int)
+    mask = np.isin(class_id, Config.SELECTED_CLASSES)
+    return result.boxes.xyxy.cpu().numpy()[mask], result.boxes.conf.cpu().numpy()[mask]
+
+def boxes_agree(boxes_a, boxes_b, iou_threshold=0.5):
+    """Check if two sets of boxes have the same count and match one to one"""
+    import supervision as sv
+
+    if len(boxes_a) != len(boxes_b):
+        return False
+    if len(boxes_a) == 0:
+        return True
+
+    iou = sv.box_iou_batch(boxes_a, boxes_b)
+    # Greedy matching, best pairs first
+    matched_b = set()
+    for a in range(len(boxes_a)):
+        candidates = [b for b in iou[a].argsort()[::-1] if b not in matched_b]
+        if not candidates or iou[a, candidates[0]] < iou_threshold:
+            return False
+        matched_b.add(candidates[0])
+    return True
+
+class CascadeModel:
+    """Small-to-large model cascade
+
+    Runs the small model on every frame and re-runs the large one only on
+    frames that look uncertain: low mean confidence, a sudden change in the
+    number of animals, or many boxes close to TRACK_THRESH. It is called like
+    a YOLO model, so detect_frame and track_video use it unchanged.
+    """
+
+    def __init__(self, small_model, large_model):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.previous_count = None
+
+        self.frames = 0
+        self.escalations = 0
+        self.reasons = {'low_confidence': 0, 'count_change': 0, 'near_threshold': 0}
+        self.small_seconds = 0.0
+        self.large_seconds = 0.0
+        self.confident_frames = 0
+        self.audited = 0
+        self.agreements = 0
+
+    def uncertainty(self, confidence):
+        """List the reasons why the small model's result looks uncertain"""
+        reasons = []
+        count = len(confidence)
+
+        if count > 0 and confidence.mean() < Config.CASCADE_MIN_CONFIDENCE:
+            reasons.append('low_confidence')
+
+        if (self.previous_count is not None
+                and abs(count - self.previous_count) >= Config.CASCADE_COUNT_CHANGE):
+            reasons.append('count_change')
+
+        if count > 0:
+            near = abs(confidence - Config.TRACK_THRESH) <= Config.CASCADE_THRESH_MARGIN
+            if near.mean() >= Config.CASCADE_NEAR_THRESH_RATIO:
+                reasons.append('near_threshold')
+
+        return reasons
+
+    def _run(self, model, frame, **kwargs):
+        start_time = time.time()
+        results = model(frame, **kwargs)
+        elapsed = time.time() - start_time
+        if model is self.small_model:
+            self.small_seconds += elapsed
+        else:
+            self.large_seconds += elapsed
+        return results
+
+    def __call__(self, frame, **kwargs):
+        self.frames += 1
+        results = self._run(self.small_model, frame, **kwargs)
+        boxes, confidence = pig_boxes(results[0])
+
+        reasons = self.uncertainty(confidence)
+        if reasons:
+            self.escalations += 1
+            for reason in reasons:
+                self.reasons[reason] += 1
+            results = self._run(self.large_model, frame, **kwargs)
+            boxes, confidence = pig_boxes(results[0])
+        else:
+            self.confident_frames += 1
+            audit_interval = Config.CASCADE_AUDIT_INTERVAL
+            if audit_interval > 0 and self.confident_frames % audit_interval == 0:
+                # Compare with what the large model alone would have said
+                large_boxes, _ = pig_boxes(self._run(self.large_model, frame, **kwargs)[0])
+                self.audited += 1
+                self.agreements += boxes_agree(boxes, large_boxes)
+
+        self.previous_count = len(confidence)
+        return results
+
+    def report(self):
+        """Per-job cascade stats"""
+        report = {
+            'frames': self.frames,
+            'escalations': self.escalations,
+            'escalation_rate': self.escalations / self.frames if self.frames else 0,
+            'reasons': dict(self.reasons),
+            'small_seconds': self.small_seconds,
+            'large_seconds': self.large_seconds,
+            'audited_frames': self.audited
+        }
+        if self.audited:
+            # Escalated frames use the large model, so they agree by definition
+            audit_agreement = self.agreements / self.audited
+            report['audit_agreement'] = audit_agreement
+            report['estimated_agreement'] = (
+                self.escalations + audit_agreement * self.confident_frames
+            ) / self.frames
+        else:
+            report['audit_agreement'] = None
+            report['estimated_agreement'] = None
+            report['audit_skipped'] = (
+                'audits are disabled (CASCADE_AUDIT_INTERVAL=0)'
+                if Config.CASCADE_AUDIT_INTERVAL <= 0
+                else f'fewer than {Config.CASCADE_AUDIT_INTERVAL} confident frames'
+            )
+        return report
+
+def create_cascade_model():
+    """Build a cascade from the configured small model and the main model"""
+    from app.utils import get_model, get_small_model
+
+    return CascadeModel(get_small_model(), get_model())
@@ -0,0 +1,225 @@
+import os
+import shutil
+import pickle
+import hashlib
+import logging
+import subprocess
+from app.config import Config
+from app.encoder import ffmpeg_available
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = 'state.pkl'
+TRACKS_FILE = 'tracks.csv'
+
+def get_checkpoint_dir(target_path):
+    """Get the checkpoint folder of the job writing target_path"""
+    return os.path.join(Config.CHECKPOINT_FOLDER, os.path.basename(target_path))
+
+def has_checkpoint(checkpoint_dir):
+    """Check if a job left a checkpoint it can be resumed from"""
+    return os.path.exists(os.path.join(checkpoint_dir, STATE_FILE))
+
+def read_state(checkpoint_dir):
+    """Load the saved state of a checkpoint, None if there is no readable one"""
+    try:
+        with open(os.path.join(checkpoint_dir, STATE_FILE), 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f'Error reading checkpoint {checkpoint_dir}: {str(e)}')
+        return None
+
+def can_resume(checkpoint_dir):
+    """Check if a job has a checkpoint and attempts left to resume from it"""
+    state = read_state(checkpoint_dir)
+    return state is not None and state.get('attempts', 1) < Config.CHECKPOINT_MAX_ATTEMPTS
+
+def remove_checkpoint(checkpoint_dir):
+    """Delete a checkpoint folder and everything in it"""
+    if os.path.exists(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        logger.info(f'Removed checkpoint {checkpoint_dir}')
+
+def source_fingerprint(source_path, settings):
+    """Identify a source video and the settings that affect its tracks
+
+    settings are the tracking_settings() the job runs with.
+    """
+    digest = hashlib.sha1()
+    with open(source_path, 'rb') as f:
+        digest.update(f.read(1024 * 1024))
+    digest.update(repr((
+        os.path.getsize(source_path),
+        Config.MODEL_PATH,
+        sorted(settings.items()),
+        Config.CASCADE_ENABLED and (
+            Config.CASCADE_SMALL_MODEL_PATH,
+            Config.CASCADE_MIN_CONFIDENCE,
+            Config.CASCADE_COUNT_CHANGE,
+            Config.CASCADE_THRESH_MARGIN,
+            Config.CASCADE_NEAR_THRESH_RATIO
+        )
+    )).encode('utf-8'))
+    return digest.hexdigest()
+
+class JobCheckpoint:
+    """Periodic checkpoint of a track_video job
+
+    A checkpoint records the next frame to process, the pickled ByteTrack
+    state, how many bytes of the track file are complete and how many video
+    segments have been fully encoded. Everything written after the last
+    checkpoint is discarded on resume. Every run that starts from the
+    checkpoint counts as an attempt, so a job that keeps failing can be
+    given up.
+
+    The annotated video is only split into segments when ffmpeg can join
+    them without re-encoding. Otherwise it is written in one piece, the
+    tracks are kept (in the checkpoint folder if the job writes no track
+    file) and the video up to the checkpoint is drawn again from them on
+    resume.
+    """
+
+    def __init__(self, checkpoint_dir, source_path, settings, target_path=None, tracks_path=None):
+        self.checkpoint_dir = checkpoint_dir
+        self.source_path = source_path
+        self.target_path = target_path
+        self.segmented = bool(target_path) and ffmpeg_available()
+        if target_path and not self.segmented and not tracks_path:
+            tracks_path = os.path.join(checkpoint_dir, TRACKS_FILE)
+        self.tracks_path = tracks_path
+        self.fingerprint = source_fingerprint(source_path, settings)
+
+        self.frame = 0
+        self.tracks_offset = 0
+        self.segments = 0
+        self.tracker = None
+        self.model_state = None
+        self.attempts = 1
+
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    @property
+    def state_path(self):
+        return os.path.join(self.checkpoint_dir, STATE_FILE)
+
+    def segment_path(self, index=None):
+        """Path of an encoded segment (the one being written by default)"""
+        index = self.segments if index is None else index
+        return os.path.join(self.checkpoint_dir, f'segment_{index:05d}.mp4')
+
+    def load(self):
+        """Load the last checkpoint, returns True if the job can resume from it"""
+        state = read_state(self.checkpoint_dir)
+        if state is None:
+            return False
+
+        if state['fingerprint'] != self.fingerprint:
+            logger.info(f'Discarding checkpoint of a different video or settings: {self.checkpoint_dir}')
+            return False
+
+        if state.get('segmented', False) != self.segmented:
+            logger.info(f'Discarding checkpoint, ffmpeg was added or removed since: {self.checkpoint_dir}')
+            return False
+
+        if self.tracks_path and (
+            not os.path.exists(self.tracks_path)
+            or os.path.getsize(self.tracks_path) < state['tracks_offset']
+        ):
+            logger.info(f'Discarding checkpoint, track file is incomplete: {self.tracks_path}')
+            return False
+
+        self.frame = state['frame']
+        self.tracks_offset = state['tracks_offset']
+        self.segments = state['segments']
+        # The tracker carries its own track_count, so ids go on where they stopped
+        self.tracker = pickle.loads(state['tracker'])
+        self.model_state = state.get('model_state')
+
+        # Count this run before it has a chance to fail
+        self.attempts = state.get('attempts', 1) + 1
+        state['attempts'] = self.attempts
+        self._write(state)
+
+        logger.info(f'Resuming {self.source_path} from frame {self.frame} (attempt {self.attempts})')
+        return True
+
+    def save(self, frame, tracker, tracks_offset, segments, model_state=None):
+        """Atomically write a checkpoint (outputs must be flushed before)"""
+        self.frame = frame
+        self.tracks_offset = tracks_offset
+        self.segments = segments
+
+        state = {
+            'fingerprint': self.fingerprint,
+            'source_path': self.source_path,
+            'target_path': self.target_path,
+            'tracks_path': self.tracks_path,
+            'frame': frame,
+            'tracks_offset': tracks_offset,
+            'segments': segments,
+            'segmented': self.segmented,
+            'tracker': pickle.dumps(tracker),
+            'model_state': model_state,
+            'attempts': self.attempts
+        }
+        self._write(state)
+        logger.debug(f'Checkpoint saved at frame {frame}')
+
+    def _write(self, state):
+        temp_path = f'{self.state_path}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.state_path)
+
+    def join_segments(self, target_path):
+        """Concatenate the encoded segments into the final video (stream copy)"""
+        segments = [self.segment_path(index) for index in range(self.segments)]
+
+        if len(segments) == 1:
+            os.replace(segments[0], target_path)
+            return
+
+        list_path = os.path.join(self.checkpoint_dir, 'segments.txt')
+        with open(list_path, 'w') as f:
+            f.writelines(f"file '{os.path.abspath(path)}'\n" for path in segments)
+        subprocess.run(
+            [Config.FFMPEG_PATH, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+             '-i', list_path, '-c', 'copy', '-movflags', '+faststart', target_path],
+            check=True
+        )
+
+    def remove(self):
+        """Delete the checkpoint once the job is complete"""
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+def find_interrupted_jobs():
+    """List (source_path, target_path) of jobs that stopped after a checkpoint
+
+    Called at startup, before any job runs. Checkpoints that cannot be
+    resumed (no state, source video gone, no attempts left) are deleted.
+    """
+    jobs = []
+    if not os.path.exists(Config.CHECKPOINT_FOLDER):
+        return jobs
+
+    for name in sorted(os.listdir(Config.CHECKPOINT_FOLDER)):
+        checkpoint_dir = os.path.join(Config.CHECKPOINT_FOLDER, name)
+        if not os.path.isdir(checkpoint_dir):
+            continue
+        state = read_state(checkpoint_dir)
+        if state is None or not state.get('target_path'):
+            # The job stopped before its first checkpoint
+            remove_checkpoint(checkpoint_dir)
+        elif not os.path.exists(state['source_path']):
+            logger.info(f"Source of checkpoint {name} is gone: {state['source_path']}")
+            remove_checkpoint(checkpoint_dir)
+        elif state.get('attempts', 1) >= Config.CHECKPOINT_MAX_ATTEMPTS:
+            logger.error(f"Giving up on {state['source_path']} after {state['attempts']} attempts")
+            remove_checkpoint(checkpoint_dir)
+        else:
+            jobs.append((state['source_path'], state['target_path']))
+    return jobs
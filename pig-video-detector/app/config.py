@@ -17,9 +17,24 @@ class Config:
     SELECTED_CLASSES = [18, 19]  # sheep (18), cow (19)
     MODEL_CONFIDENCE = float(os.getenv('MODEL_CONFIDENCE', '0.25'))
 
+    # Cascade Configuration
+    # Run the small model on every frame and the main model only on uncertain ones
+    CASCADE_ENABLED = os.getenv('CASCADE_ENABLED', '0') == '1'
+    CASCADE_SMALL_MODEL_PATH = os.path.join(BASE_DIR, 'yolov8s.pt')
+    CASCADE_MIN_CONFIDENCE = float(os.getenv('CASCADE_MIN_CONFIDENCE', '0.5'))
+    CASCADE_COUNT_CHANGE = int(os.getenv('CASCADE_COUNT_CHANGE', '2'))
+    CASCADE_THRESH_MARGIN = float(os.getenv('CASCADE_THRESH_MARGIN', '0.1'))
+    CASCADE_NEAR_THRESH_RATIO = float(os.getenv('CASCADE_NEAR_THRESH_RATIO', '0.3'))
+    # Every Nth confident frame is also run through the main model to measure agreement (0 disables audits)
+    CASCADE_AUDIT_INTERVAL = int(os.getenv('CASCADE_AUDIT_INTERVAL', '30'))
+
     # Folder Configuration
     UPLOAD_FOLDER = os.path.join(APP_DIR, 'uploads')
     PROCESSED_FOLDER = os.path.join(APP_DIR, 'processed')
+    CHECKPOINT_FOLDER = os.path.join(APP_DIR, 'checkpoints')
+    DETECTION_CACHE_FOLDER = os.path.join(APP_DIR, 'detection_cache')
+    PREVIEW_FOLDER = os.path.join(APP_DIR, 'previews')
+    PROGRESS_FOLDER = os.path.join(APP_DIR, 'progress')
     STATIC_FOLDER = os.path.join(APP_DIR, 'static')
     TEMPLATE_FOLDER = os.path.join(APP_DIR, 'templates')
 
@@ -27,8 +42,69 @@ class Config:
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 104857600))  # 100MB
     ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv'}
 
+    # Storage Configuration
+    # Uploads, outputs and caches are evicted least recently used first when
+    # over the quota, or when unused for CLEANUP_INTERVAL hours (0 disables either)
+    STORAGE_QUOTA_MB = int(os.getenv('STORAGE_QUOTA_MB', '10240'))
+    CLEANUP_INTERVAL = int(os.getenv('CLEANUP_INTERVAL', '24'))
+    STORAGE_JANITOR_INTERVAL = int(os.getenv('STORAGE_JANITOR_INTERVAL', '60'))  # seconds
+
     # Tracking Configuration
     TRACK_THRESH = float(os.getenv('TRACK_THRESH', '0.25'))
     TRACK_BUFFER = int(os.getenv('TRACK_BUFFER', '30'))
     MATCH_THRESH = float(os.getenv('MATCH_THRESH', '0.8'))
-    FRAME_RATE = int(os.getenv('FRAME_RATE', '30'))
\ No newline at end of file
+    FRAME_RATE = int(os.getenv('FRAME_RATE', '30'))
+
+    # Detection Cache Configuration
+    # Raw model outputs are cached so videos can be re-tracked without inference
+    DETECTION_CACHE_ENABLED = os.getenv('DETECTION_CACHE_ENABLED', '1') == '1'
+    CACHE_MIN_CONFIDENCE = float(os.getenv('CACHE_MIN_CONFIDENCE', '0.1'))
+
+    # Checkpoint Configuration
+    # Frames between checkpoints of a running job (0 disables checkpoints)
+    CHECKPOINT_INTERVAL = int(os.getenv('CHECKPOINT_INTERVAL', '300'))
+    # Runs of a job (the first one included) before its checkpoint is given up
+    CHECKPOINT_MAX_ATTEMPTS = int(os.getenv('CHECKPOINT_MAX_ATTEMPTS', '3'))
+
+    # Output Encoding Configuration
+    # Annotated videos are encoded by ffmpeg when it is installed
+    FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+    VIDEO_CODEC = os.getenv('VIDEO_CODEC', 'libx264')
+    VIDEO_PRESET = os.getenv('VIDEO_PRESET', 'veryfast')
+    VIDEO_CRF = int(os.getenv('VIDEO_CRF', '23'))
+    VIDEO_MAX_WIDTH = int(os.getenv('VIDEO_MAX_WIDTH', '0'))  # 0 keeps the source size
+    FFMPEG_THREADS = int(os.getenv('FFMPEG_THREADS', '0'))  # 0 lets ffmpeg decide
+    ENCODER_QUEUE_SIZE = int(os.getenv('ENCODER_QUEUE_SIZE', '32'))
+    JOB_STATS_FILE = os.path.join(APP_DIR, 'job_stats.jsonl')
+
+    # Inference Scheduler Configuration
+    # Concurrent jobs share the model through one thread that batches their frames
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '0') == '1'
+    SCHEDULER_MAX_BATCH = int(os.getenv('SCHEDULER_MAX_BATCH', '8'))
+    SCHEDULER_MAX_WAIT_MS = float(os.getenv('SCHEDULER_MAX_WAIT_MS', '20'))
+    SCHEDULER_SLO_MS = float(os.getenv('SCHEDULER_SLO_MS', '2000'))  # per-frame latency target of a job
+    SCHEDULER_MAX_JOBS = int(os.getenv('SCHEDULER_MAX_JOBS', '4'))  # jobs run at once by the inference worker
+
+    # Preview Configuration
+    # Thumbnails of a few keyframes are built right after upload on a
+    # low-priority lane with its own model (the small one when available)
+    PREVIEW_ENABLED = os.getenv('PREVIEW_ENABLED', '1') == '1'
+    PREVIEW_MODEL_PATH = os.path.join(BASE_DIR, 'yolov8s.pt')
+    PREVIEW_FRAMES = int(os.getenv('PREVIEW_FRAMES', '6'))
+    PREVIEW_WIDTH = int(os.getenv('PREVIEW_WIDTH', '640'))
+    PREVIEW_IMGSZ = int(os.getenv('PREVIEW_IMGSZ', '320'))
+    PREVIEW_QUEUE_SIZE = int(os.getenv('PREVIEW_QUEUE_SIZE', '8'))
+    PREVIEW_NICE = int(os.getenv('PREVIEW_NICE', '10'))
+
+    # Admission Control Configuration
+    # Uploads are deferred (HTTP 429) while the estimated backlog is over
+    # ADMISSION_MAX_BACKLOG seconds (0 admits everything)
+    ADMISSION_MAX_BACKLOG = float(os.getenv('ADMISSION_MAX_BACKLOG', '1800'))
+    ADMISSION_DEFAULT_FPS = float(os.getenv('ADMISSION_DEFAULT_FPS', '5'))  # until jobs have been recorded
+    ADMISSION_HISTORY = int(os.getenv('ADMISSION_HISTORY', '50'))  # recent jobs used to estimate throughput
+
+    # Inference Worker Configuration
+    # When set, HTTP workers hand jobs to a single inference process over this
+    # unix socket instead of running the model in their own threads
+    INFERENCE_ADDRESS = os.getenv('INFERENCE_ADDRESS', '')
+    INFERENCE_AUTHKEY = os.getenv('INFERENCE_AUTHKEY', SECRET_KEY)
\ No newline at end of file
@@ -0,0 +1,140 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Every cached box is a float32 row: x1, y1, x2, y2, confidence, class_id
+BOX_COLUMNS = 6
+BOXES_FILE = 'boxes.f32'
+INDEX_FILE = 'index.npy'
+META_FILE = 'meta.json'
+
+def video_hash(source_path):
+    """SHA-1 of the whole video file"""
+    digest = hashlib.sha1()
+    with open(source_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_cache_key(source_path, model_path=None):
+    """Cache key of a video processed with a model"""
+    model_name = os.path.splitext(os.path.basename(model_path or Config.MODEL_PATH))[0]
+    return f'{video_hash(source_path)[:16]}_{model_name}'
+
+def get_cache_dir(cache_key):
+    """Folder holding the cached model outputs of cache_key"""
+    if os.path.basename(cache_key) != cache_key:
+        raise ValueError(f'Invalid cache key: {cache_key}')
+    return os.path.join(Config.DETECTION_CACHE_FOLDER, cache_key)
+
+class DetectionCacheWriter:
+    """Append raw model outputs frame by frame
+
+    Boxes go straight to disk; only the per-frame offsets are kept in memory.
+    The cache is written to a temporary folder and moved into place when
+    complete, so readers never see a partial cache.
+    """
+
+    def __init__(self, cache_dir, video_info, meta):
+        self.cache_dir = cache_dir
+        self.temp_dir = f'{cache_dir}.partial'
+        self.video_info = video_info
+        self.meta = meta
+        self.offsets = [0]
+
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        os.makedirs(self.temp_dir)
+        self.boxes_file = open(os.path.join(self.temp_dir, BOXES_FILE), 'wb')
+
+    def append(self, xyxy, confidence, class_id):
+        """Store the raw outputs of the next frame"""
+        import numpy as np
+
+        rows = np.empty((len(confidence), BOX_COLUMNS), dtype=np.float32)
+        rows[:, 0:4] = xyxy
+        rows[:, 4] = confidence
+        rows[:, 5] = class_id
+        self.boxes_file.write(rows.tobytes())
+        self.offsets.append(self.offsets[-1] + len(rows))
+
+    def close(self):
+        """Finish the cache and move it into place"""
+        import numpy as np
+
+        self.boxes_file.close()
+        np.save(os.path.join(self.temp_dir, INDEX_FILE), np.array(self.offsets, dtype=np.int64))
+        with open(os.path.join(self.temp_dir, META_FILE), 'w') as f:
+            json.dump({
+                **self.meta,
+                'frames': len(self.offsets) - 1,
+                'boxes': self.offsets[-1],
+                'fps': self.video_info.fps,
+                'width': self.video_info.width,
+                'height': self.video_info.height
+            }, f, indent=2)
+
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.replace(self.temp_dir, self.cache_dir)
+        logger.info(f'Detection cache saved: {self.cache_dir} ({self.offsets[-1]} boxes)')
+
+    def abort(self):
+        """Drop an incomplete cache"""
+        self.boxes_file.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+class DetectionCache:
+    """Memory-mapped read access to the cached model outputs of a video"""
+
+    def __init__(self, cache_dir):
+        import numpy as np
+
+        self.cache_dir = cache_dir
+        meta_path = os.path.join(cache_dir, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f'Detection cache not found: {cache_dir}')
+
+        with open(meta_path, 'r') as f:
+            self.meta = json.load(f)
+        self.frames = self.meta['frames']
+        self.offsets = np.load(os.path.join(cache_dir, INDEX_FILE), mmap_mode='r')
+
+        boxes_path = os.path.join(cache_dir, BOXES_FILE)
+        if self.meta['boxes'] > 0:
+            self.boxes = np.memmap(boxes_path, dtype=np.float32, mode='r').reshape(-1, BOX_COLUMNS)
+        else:
+            # numpy cannot map an empty file
+            self.boxes = np.empty((0, BOX_COLUMNS), dtype=np.float32)
+
+    def video_info(self):
+        """VideoInfo of the source video, without needing the video itself"""
+        import supervision as sv
+
+        return sv.VideoInfo(
+            width=self.meta['width'],
+            height=self.meta['height'],
+            fps=self.meta['fps'],
+            total_frames=self.frames
+        )
+
+    def frame(self, index):
+        """Raw (xyxy, confidence, class_id) of a frame"""
+        rows = self.boxes[self.offsets[index]:self.offsets[index + 1]]
+        return rows[:, 0:4], rows[:, 4], rows[:, 5].astype(int)
+
+def list_caches():
+    """Metadata of every complete cache"""
+    caches = []
+    if not os.path.exists(Config.DETECTION_CACHE_FOLDER):
+        return caches
+
+    for key in sorted(os.listdir(Config.DETECTION_CACHE_FOLDER)):
+        meta_path = os.path.join(Config.DETECTION_CACHE_FOLDER, key, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                caches.append({'key': key, **json.load(f)})
+    return caches
@@ -0,0 +1,175 @@
+import os
+import time
+import queue
+import shutil
+import logging
+import tempfile
+import subprocess
+from threading import Thread
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Per-process CPU time of ffmpeg needs os.wait4, which Windows lacks
+CAN_MEASURE_CPU = hasattr(os, 'wait4')
+
+def ffmpeg_available():
+    """Check if the configured ffmpeg binary can be found"""
+    return shutil.which(Config.FFMPEG_PATH) is not None
+
+def output_size(width, height, max_width):
+    """Size of the encoded video after the optional downscale (even dimensions)"""
+    if max_width and width > max_width:
+        height = round(height * max_width / width)
+        width = max_width
+    return width - width % 2, height - height % 2
+
+class FFmpegVideoSink:
+    """Encode frames with an ffmpeg subprocess
+
+    Drop-in replacement for sv.VideoSink. Frames are handed to a writer
+    thread through a bounded queue and written to ffmpeg's stdin without
+    copying, so encoding runs in parallel with inference and ffmpeg uses its
+    own threads.
+    """
+
+    def __init__(self, target_path, video_info, codec=None, preset=None, crf=None,
+                 max_width=None, threads=None, queue_size=None):
+        self.target_path = target_path
+        self.video_info = video_info
+        self.codec = codec or Config.VIDEO_CODEC
+        self.preset = preset or Config.VIDEO_PRESET
+        self.crf = Config.VIDEO_CRF if crf is None else crf
+        self.max_width = Config.VIDEO_MAX_WIDTH if max_width is None else max_width
+        self.threads = Config.FFMPEG_THREADS if threads is None else threads
+        self.queue_size = queue_size or Config.ENCODER_QUEUE_SIZE
+
+        self.process = None
+        self.writer = None
+        self.frames = None
+        self.error = None
+        self.stderr = None
+        self.stats = {
+            'frames': 0,
+            'bytes': 0,
+            'encode_cpu_seconds': 0.0,
+            'blocked_seconds': 0.0
+        }
+
+    def command(self):
+        """Build the ffmpeg command line"""
+        width, height = self.video_info.width, self.video_info.height
+        command = [
+            Config.FFMPEG_PATH, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{width}x{height}', '-r', str(self.video_info.fps),
+            '-i', '-'
+        ]
+
+        out_width, out_height = output_size(width, height, self.max_width)
+        if (out_width, out_height) != (width, height):
+            command += ['-vf', f'scale={out_width}:{out_height}']
+
+        command += [
+            '-c:v', self.codec,
+            '-preset', self.preset,
+            '-crf', str(self.crf),
+            '-threads', str(self.threads),
+            # Browser friendly: 4:2:0 chroma and the index at the start
+            '-pix_fmt', 'yuv420p',
+            '-movflags', '+faststart',
+            self.target_path
+        ]
+        return command
+
+    def __enter__(self):
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            self.command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self.stderr
+        )
+        self.frames = queue.Queue(maxsize=self.queue_size)
+        self.writer = Thread(target=self._write_frames, daemon=True)
+        self.writer.start()
+        return self
+
+    def _write_frames(self):
+        """Writer thread: feed queued frames to ffmpeg"""
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.process.stdin.write(memoryview(frame))
+            except (BrokenPipeError, OSError) as e:
+                self.error = e
+
+    def write_frame(self, frame):
+        """Queue a frame for encoding (blocks while the queue is full)"""
+        import numpy as np
+
+        expected_shape = (self.video_info.height, self.video_info.width, 3)
+        if frame.shape != expected_shape:
+            raise ValueError(f'Frame shape {frame.shape} does not match video {expected_shape}')
+
+        frame = np.ascontiguousarray(frame)
+        start_time = time.time()
+        while True:
+            if self.error is not None:
+                raise RuntimeError(f'ffmpeg stopped accepting frames: {self._stderr_tail()}')
+            try:
+                self.frames.put(frame, timeout=1)
+                break
+            except queue.Full:
+                continue
+        self.stats['blocked_seconds'] += time.time() - start_time
+        self.stats['frames'] += 1
+
+    def _stderr_tail(self):
+        self.stderr.seek(0)
+        return self.stderr.read().decode('utf-8', errors='replace').strip()[-500:]
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.frames.put(None)
+        self.writer.join()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+        if CAN_MEASURE_CPU:
+            # wait4 gives us the CPU time spent by this ffmpeg process
+            _, status, usage = os.wait4(self.process.pid, 0)
+            self.process.returncode = os.waitstatus_to_exitcode(status)
+            self.stats['encode_cpu_seconds'] = usage.ru_utime + usage.ru_stime
+        else:
+            self.process.wait()
+            self.stats['encode_cpu_seconds'] = None
+
+        error = self._stderr_tail() if self.process.returncode != 0 else None
+        self.stderr.close()
+
+        if os.path.exists(self.target_path):
+            self.stats['bytes'] = os.path.getsize(self.target_path)
+
+        if error is not None and exc_type is None:
+            raise RuntimeError(f'ffmpeg exited with code {self.process.returncode}: {error}')
+
+_warned_missing_ffmpeg = False
+
+def open_video_sink(target_path, video_info):
+    """Get the video writer for target_path (ffmpeg, or OpenCV without it)"""
+    global _warned_missing_ffmpeg
+    if ffmpeg_available():
+        return FFmpegVideoSink(target_path, video_info)
+
+    import supervision as sv
+
+    if not _warned_missing_ffmpeg:
+        logger.warning(f'{Config.FFMPEG_PATH} not found, falling back to OpenCV VideoWriter')
+        _warned_missing_ffmpeg = True
+    return sv.VideoSink(target_path, video_info)
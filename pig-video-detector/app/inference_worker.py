@@ -0,0 +1,159 @@
+import os
+import sys
+import logging
+import tempfile
+import subprocess
+from multiprocessing.connection import Listener, Client
+from app.config import Config
+from app.storage import get_storage
+from app.admission import admit_job, get_admission, scheduler_in_use
+from app.preview import get_preview_lane
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), 'pig-inference.sock')
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def get_address():
+    """Get the unix socket address of the inference worker"""
+    return Config.INFERENCE_ADDRESS or DEFAULT_ADDRESS
+
+def get_authkey():
+    """Get the shared key used to authenticate HTTP workers"""
+    return Config.INFERENCE_AUTHKEY.encode('utf-8')
+
+def get_rss_mb(pid=None):
+    """Get the resident set size of a process in MB (Linux only)"""
+    status_file = f'/proc/{pid or os.getpid()}/status'
+    try:
+        with open(status_file, 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError as e:
+        logger.error(f'Error reading memory usage from {status_file}: {str(e)}')
+    return 0.0
+
+def _handle_request(request):
+    """Handle a single request received from an HTTP worker"""
+    from app.utils import queue_job, get_job_queue, queue_retrack
+
+    action = request.get('action')
+
+    if action == 'ping':
+        return {'ok': True, 'pid': os.getpid(), 'rss_mb': get_rss_mb()}
+
+    if action == 'process':
+        decision = admit_job(os.path.basename(request['output_path']), request['input_path'])
+        if decision['admitted']:
+            queue_job(request['input_path'], request['output_path'])
+            logger.info(f"Queued job: {request['input_path']}")
+        return {'ok': True, **decision, 'queued': get_job_queue().qsize()}
+
+    if action == 'preview':
+        queued = get_preview_lane().submit(request['preview_id'], request['source_path'])
+        return {'ok': True, 'queued': queued}
+
+    if action == 'retrack':
+        queue_retrack(request['cache_key'], request['tracks_path'], request['overrides'])
+        return {'ok': True}
+
+    if action == 'queue':
+        return {'ok': True, **get_admission().snapshot()}
+
+    if action == 'storage':
+        # Accesses and new files seen by the HTTP workers
+        if request['op'] == 'touch':
+            get_storage().touch(request['path'])
+        else:
+            get_storage().add(request['path'], request['kind'], request.get('owner'))
+        return {'ok': True}
+
+    return {'ok': False, 'error': f'Unknown action: {action}'}
+
+def serve(address=None, authkey=None):
+    """Load the model once and serve processing jobs over a unix socket"""
+    from app.utils import get_model, get_job_queue, resume_interrupted_jobs
+    from app.scheduler import get_scheduler
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    address = address or get_address()
+    authkey = authkey or get_authkey()
+
+    # Load the model before accepting jobs, this is the only copy in the deployment
+    get_model()
+    logger.info(f'Inference worker ready (pid {os.getpid()}, {get_rss_mb():.1f} MB RSS)')
+
+    # With the scheduler, up to SCHEDULER_MAX_JOBS jobs share the model in batches
+    if scheduler_in_use():
+        get_scheduler()
+    get_job_queue()
+
+    # Index the stored files once, then keep them within the disk quota
+    get_storage().start_janitor()
+
+    # Pick up the jobs that were running when the previous worker died
+    resume_interrupted_jobs()
+
+    if os.path.exists(address):
+        os.remove(address)
+
+    with Listener(address, family='AF_UNIX', authkey=authkey) as listener:
+        logger.info(f'Inference worker listening on {address}')
+        while True:
+            try:
+                with listener.accept() as conn:
+                    conn.send(_handle_request(conn.recv()))
+            except Exception as e:
+                logger.error(f'Error handling inference request: {str(e)}')
+
+def start_inference_server(address=None, authkey=None):
+    """Start the inference worker in a fresh interpreter and return its Popen
+
+    A plain subprocess rather than a multiprocessing child: gunicorn forks
+    the HTTP workers after this, and each of them would inherit a
+    multiprocessing child and terminate it on its way out.
+    """
+    env = dict(os.environ)
+    env['INFERENCE_ADDRESS'] = address or get_address()
+    env['INFERENCE_AUTHKEY'] = (authkey or get_authkey()).decode('utf-8')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'app.inference_worker'],
+        cwd=PROJECT_DIR,
+        env=env
+    )
+    logger.info(f'Started inference worker process (pid {process.pid})')
+    return process
+
+def stop_inference_server(process, timeout=10):
+    """Terminate the inference worker and wait for it to exit"""
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def send_request(request, address=None, authkey=None):
+    """Send a request to the inference worker and return its reply"""
+    with Client(address or get_address(), family='AF_UNIX', authkey=authkey or get_authkey()) as conn:
+        conn.send(request)
+        return conn.recv()
+
+def submit_job(input_path, output_path):
+    """Hand a processing job to the inference worker, returns its admission decision"""
+    reply = send_request({
+        'action': 'process',
+        'input_path': input_path,
+        'output_path': output_path
+    })
+    if not reply.get('ok'):
+        raise RuntimeError(reply.get('error', 'Inference worker rejected the job'))
+    return reply
+
+if __name__ == '__main__':
+    serve()
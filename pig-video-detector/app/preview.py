@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+from app.config import Config
+from app.admission import probe_video
+from app.encoder import ffmpeg_available, output_size
+from app.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_FILE = 'preview.json'
+
+def get_preview_dir(preview_id):
+    """Folder holding the preview of an upload"""
+    if os.path.basename(preview_id) != preview_id:
+        raise ValueError(f'Invalid preview id: {preview_id}')
+    return os.path.join(Config.PREVIEW_FOLDER, preview_id)
+
+def write_status(preview_dir, status, **fields):
+    """Atomically write the preview's status file"""
+    os.makedirs(preview_dir, exist_ok=True)
+    path = os.path.join(preview_dir, PREVIEW_FILE)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump({'status': status, 'timestamp': time.time(), **fields}, f)
+    os.replace(f'{path}.tmp', path)
+
+def read_status(preview_dir):
+    """Read the preview's status file, None if there is no preview"""
+    path = os.path.join(preview_dir, PREVIEW_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def sample_times(duration, count):
+    """Evenly spaced timestamps, away from the very start and end"""
+    return [duration * (index + 0.5) / count for index in range(count)]
+
+def read_keyframe_ffmpeg(path, timestamp, width, height):
+    """Decode the keyframe at or before timestamp, scaled to width x height
+
+    Input seeking jumps straight to the keyframe and -skip_frame nokey
+    stops the decoder from touching any other frame.
+    """
+    import numpy as np
+
+    result = subprocess.run(
+        [Config.FFMPEG_PATH, '-v', 'error',
+         '-skip_frame', 'nokey', '-noaccurate_seek', '-ss', f'{timestamp:.3f}', '-i', path,
+         '-frames:v', '1', '-vf', f'scale={width}:{height}',
+         '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    if len(result.stdout) < width * height * 3:
+        return None
+    return np.frombuffer(result.stdout[:width * height * 3], dtype=np.uint8).reshape(height, width, 3)
+
+def read_frame_opencv(path, timestamp, width, height):
+    """Seek with OpenCV (decodes from the previous keyframe) and downscale"""
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    try:
+        capture.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+        ok, frame = capture.read()
+    finally:
+        capture.release()
+    if not ok:
+        return None
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+def sample_frames(path, count=None, max_width=None):
+    """Get (timestamp, frame) pairs spread over the video at reduced resolution"""
+    count = count or Config.PREVIEW_FRAMES
+    probe = probe_video(path)
+    width, height = output_size(probe['width'], probe['height'], max_width or Config.PREVIEW_WIDTH)
+    duration = probe['frames'] / probe['fps'] if probe['fps'] > 0 else probe['frames'] / Config.FRAME_RATE
+
+    read_frame = read_keyframe_ffmpeg if ffmpeg_available() else read_frame_opencv
+    frames = []
+    for timestamp in sample_times(duration, count):
+        frame = read_frame(path, timestamp, width, height)
+        if frame is not None:
+            frames.append((timestamp, frame))
+    return frames
+
+def make_preview(source_path, preview_dir, model):
+    """Detect animals on a few sampled frames and save annotated thumbnails"""
+    import cv2
+    import numpy as np
+    import supervision as sv
+    from app.utils import filter_detections
+
+    start_time = time.time()
+    frames = sample_frames(source_path)
+    if not frames:
+        raise ValueError('No frames could be read from the video')
+
+    results = model(
+        [frame for _, frame in frames],
+        verbose=False,
+        conf=Config.MODEL_CONFIDENCE,
+        imgsz=Config.PREVIEW_IMGSZ
+    )
+
+    box_annotator = sv.BoxAnnotator(thickness=2)
+    thumbnails = []
+    for index, ((timestamp, frame), result) in enumerate(zip(frames, results)):
+        detections = filter_detections(
+            result.boxes.xyxy.cpu().numpy(),
+            result.boxes.conf.cpu().numpy(),
+            result.boxes.cls.cpu().numpy().astype(int)
+        )
+        thumbnail = box_annotator.annotate(scene=frame.copy(), detections=detections, skip_label=True)
+        cv2.putText(thumbnail, f'{len(detections)}', (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+        name = f'thumb_{index:02d}.jpg'
+        cv2.imwrite(os.path.join(preview_dir, name), thumbnail, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        thumbnails.append({'name': name, 'time': round(timestamp, 2), 'count': len(detections)})
+
+    counts = [thumbnail['count'] for thumbnail in thumbnails]
+    return {
+        'count': int(round(float(np.median(counts)))),
+        'max_count': max(counts),
+        'thumbnails': thumbnails,
+        'elapsed': round(time.time() - start_time, 2)
+    }
+
+def load_preview_model():
+    """Load the model used for previews (the small one when available)"""
+    from app.utils import load_model
+
+    path = Config.PREVIEW_MODEL_PATH
+    if not os.path.exists(path):
+        path = Config.MODEL_PATH
+    return load_model(path)
+
+class PreviewLane:
+    """Low-priority lane that builds previews right after upload
+
+    Runs in its own thread with its own (small) model, so it never waits
+    for the processing jobs nor shares a model with them, and its thread is
+    niced so the processing jobs keep the CPU when both are busy. When the
+    lane is full new previews are skipped instead of queued.
+    """
+
+    def __init__(self, model=None, queue_size=None):
+        self.model = model
+        self.requests = queue.Queue(maxsize=queue_size or Config.PREVIEW_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name='preview-lane', daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, preview_id, source_path):
+        """Queue a preview, returns False (keeping any older preview) if the lane is full"""
+        preview_dir = get_preview_dir(preview_id)
+        # Only submit() adds requests, so under the lock a free slot stays free
+        # and the old preview is replaced only once the new one is sure to run
+        with self.lock:
+            if self.requests.full():
+                logger.info(f'Preview lane full, skipping preview of {preview_id}')
+                return False
+            shutil.rmtree(preview_dir, ignore_errors=True)
+            write_status(preview_dir, 'pending')
+            get_storage().pin(source_path)
+            self.requests.put_nowait((preview_dir, source_path))
+        return True
+
+    def _lower_priority(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), Config.PREVIEW_NICE)
+        except (AttributeError, OSError) as e:
+            logger.error(f'Error lowering preview lane priority: {str(e)}')
+
+    def _loop(self):
+        self._lower_priority()
+        while True:
+            preview_dir, source_path = self.requests.get()
+            try:
+                if self.model is None:
+                    self.model = load_preview_model()
+                preview = make_preview(source_path, preview_dir, self.model)
+                write_status(preview_dir, 'ready', **preview)
+                logger.info(
+                    f"Preview of {os.path.basename(source_path)}: ~{preview['count']} animals "
+                    f"in {preview['elapsed']:.2f}s"
+                )
+            except Exception as e:
+                logger.error(f'Error building preview of {source_path}: {str(e)}')
+                write_status(preview_dir, 'error', error=str(e))
+            finally:
+                # Error previews are indexed too, so the janitor cleans them up
+                get_storage().add(preview_dir, 'preview', os.path.basename(preview_dir))
+                get_storage().unpin(source_path)
+                self.requests.task_done()
+
+preview_lane = None
+_preview_lock = threading.Lock()
+
+def get_preview_lane():
+    """Get or start the preview lane of this process"""
+    global preview_lane
+    with _preview_lock:
+        if preview_lane is None:
+            preview_lane = PreviewLane().start()
+    return preview_lane
+
+def submit_preview(preview_id, source_path):
+    """Ask for the preview of an upload (in the inference worker if there is one)"""
+    try:
+        if Config.INFERENCE_ADDRESS:
+            from app.inference_worker import send_request
+            return send_request({'action': 'preview', 'preview_id': preview_id, 'source_path': source_path}).get('queued', False)
+        return get_preview_lane().submit(preview_id, source_path)
+    except Exception as e:
+        logger.error(f'Error requesting preview of {source_path}: {str(e)}')
+        return False
@@ -1,15 +1,23 @@
 from flask import Blueprint, render_template, request, jsonify, send_file, current_app
 from werkzeug.utils import secure_filename
 import os
-from app.utils import allowed_file, process_video, get_progress, save_progress, cleanup_old_files
+import uuid
+from app.utils import allowed_file, queue_job, queue_retrack, get_progress
+from app.detection_cache import list_caches, get_cache_dir, META_FILE
+from app.storage import notify_storage
+from app.admission import admit_job, get_admission
+from app.preview import submit_preview, get_preview_dir, read_status
+from app.inference_worker import submit_job, send_request
 from app.config import Config
 import logging
-from threading import Thread
 
 # Initialize Blueprint
 main = Blueprint('main', __name__)
 logger = logging.getLogger(__name__)
 
+# Seconds a client should wait before retrying when the inference worker is down
+INFERENCE_RETRY_AFTER = 10
+
 @main.route('/metrics')
 def metrics():
     return render_template('metrics.html')
@@ -35,37 +43,32 @@ def index():
     """Render the main page"""
     return render_template('index.html')
 
-@main.route('/progress')
-def get_progress_status():
-    """Get the current processing progress"""
+@main.route('/progress/<job_id>')
+def get_progress_status(job_id):
+    """Get the progress and status (queued, running, done or error) of a job"""
     try:
-        progress_data = get_progress()
-        logger.debug(f'Progress data: {progress_data}')
+        progress_data = get_progress(secure_filename(job_id))
+        if progress_data is None:
+            return jsonify({'error': 'Job not found'}), 404
+        logger.debug(f'Progress of {job_id}: {progress_data}')
         return jsonify(progress_data)
     except Exception as e:
         logger.error(f'Error getting progress: {str(e)}')
-        return jsonify({'progress': 0})
+        return jsonify({'error': str(e)}), 500
 
-def process_video_async(input_path, output_path):
-    """Process video in a separate thread"""
+@main.route('/queue')
+def queue_status():
+    """List the admitted jobs with their ETA"""
     try:
-        save_progress(0)  # Reset progress
-        process_video(input_path, output_path)
-        save_progress(100)  # Mark as complete
-        logger.info('Video processing completed successfully')
-        
-        # Cleanup input file after successful processing
-        if os.path.exists(input_path):
-            os.remove(input_path)
-            logger.info(f'Cleaned up input file: {input_path}')
+        if Config.INFERENCE_ADDRESS:
+            status = send_request({'action': 'queue'})
+            status.pop('ok', None)
+        else:
+            status = get_admission().snapshot()
+        return jsonify(status)
     except Exception as e:
-        logger.error(f'Error in async processing: {str(e)}')
-        save_progress(0)  # Reset progress on error
-        # Cleanup files in case of error
-        for path in [input_path, output_path]:
-            if os.path.exists(path):
-                os.remove(path)
-                logger.info(f'Cleaned up file after error: {path}')
+        logger.error(f'Error getting queue status: {str(e)}')
+        return jsonify({'error': str(e)}), 500
 
 @main.route('/upload', methods=['POST'])
 def upload_file():
@@ -84,7 +87,8 @@ def upload_file():
             logger.error(f'Invalid file type: {file.filename}')
             return jsonify({'error': 'Unsupported file format'}), 400
 
-        filename = secure_filename(file.filename)
+        # A unique prefix so re-uploading a name never touches a queued job's files
+        filename = f'{uuid.uuid4().hex[:8]}_{secure_filename(file.filename)}'
         input_path = os.path.join(Config.UPLOAD_FOLDER, filename)
         output_filename = f'processed_{filename}'
         output_path = os.path.join(Config.PROCESSED_FOLDER, output_filename)
@@ -96,17 +100,53 @@ def upload_file():
         logger.info(f'Saving uploaded file to: {input_path}')
         file.save(input_path)
         
-        # Start processing in background thread
-        processing_thread = Thread(
-            target=process_video_async,
-            args=(input_path, output_path)
-        )
-        processing_thread.start()
-        
+        if Config.INFERENCE_ADDRESS:
+            # Hand the job to the shared inference worker, which decides on admission
+            try:
+                decision = submit_job(input_path, output_path)
+            except (OSError, EOFError) as e:
+                # Still loading the model, or not running at all
+                logger.error(f'Inference worker unavailable: {str(e)}')
+                os.remove(input_path)
+                response = jsonify({
+                    'error': 'The processing service is not available, please try again later',
+                    'retry_after': INFERENCE_RETRY_AFTER
+                })
+                response.headers['Retry-After'] = str(INFERENCE_RETRY_AFTER)
+                return response, 503
+        else:
+            decision = admit_job(output_filename, input_path)
+            if decision['admitted']:
+                # Wait for a job slot, like the inference worker does
+                queue_job(input_path, output_path)
+
+        if not decision['admitted']:
+            os.remove(input_path)
+            if 'error' in decision:
+                return jsonify({'error': decision['error']}), 400
+
+            logger.info(f"Deferred {filename}, retry in {decision['retry_after']}s")
+            response = jsonify({
+                'error': 'The server is busy, please try again later',
+                'retry_after': decision['retry_after'],
+                'estimated_seconds': decision['estimated_seconds']
+            })
+            response.headers['Retry-After'] = str(decision['retry_after'])
+            return response, 429
+
+        # Quick look at the video while the full processing runs
+        preview_id = output_filename
+        preview_queued = Config.PREVIEW_ENABLED and submit_preview(preview_id, input_path)
+
         return jsonify({
             'success': True,
             'message': 'Processing started',
-            'processed_video': f'/processed/{output_filename}'
+            'processed_video': f'/processed/{output_filename}',
+            'progress': f'/progress/{output_filename}',
+            'preview': f'/preview/{preview_id}' if preview_queued else None,
+            'queue_position': decision['queue_position'],
+            'eta_seconds': decision['eta_seconds'],
+            'estimated_seconds': decision['estimated_seconds']
         })
 
     except Exception as e:
@@ -123,13 +163,118 @@ def processed_file(filename):
         if not os.path.exists(file_path):
             logger.error(f'File not found at path: {file_path}')
             return jsonify({'error': 'File not found'}), 404
-            
+
+        notify_storage('touch', file_path)
         return send_file(
             file_path,
             as_attachment=True,
             download_name=filename,
-            mimetype='video/mp4'
+            mimetype='text/csv' if filename.endswith('.csv') else 'video/mp4'
         )
     except Exception as e:
         logger.error(f'Error sending file: {str(e)}')
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/preview/<preview_id>')
+def preview_status(preview_id):
+    """Get the preview of an upload: pending, ready (with thumbnails) or error"""
+    try:
+        status = read_status(get_preview_dir(secure_filename(preview_id)))
+        if status is None:
+            return jsonify({'error': 'Preview not found'}), 404
+
+        for thumbnail in status.get('thumbnails', []):
+            thumbnail['url'] = f"/preview/{preview_id}/{thumbnail['name']}"
+        return jsonify(status)
+    except Exception as e:
+        logger.error(f'Error reading preview {preview_id}: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/preview/<preview_id>/<filename>')
+def preview_thumbnail(preview_id, filename):
+    """Serve a preview thumbnail"""
+    preview_dir = get_preview_dir(secure_filename(preview_id))
+    file_path = os.path.join(preview_dir, secure_filename(filename))
+    if not os.path.exists(file_path):
+        return jsonify({'error': 'File not found'}), 404
+
+    notify_storage('touch', preview_dir)
+    return send_file(file_path, mimetype='image/jpeg')
+
+def parse_classes(value):
+    """Parse a JSON list of class ids (a string would be split into digits)"""
+    if not isinstance(value, list):
+        raise ValueError('selected_classes must be a list of class ids')
+    return [int(class_id) for class_id in value]
+
+# Tracking settings accepted by /retrack and how to parse them
+RETRACK_SETTINGS = {
+    'model_confidence': float,
+    'track_thresh': float,
+    'match_thresh': float,
+    'track_buffer': int,
+    'selected_classes': parse_classes
+}
+
+@main.route('/detection_cache')
+def detection_cache():
+    """List the videos whose raw model outputs are cached"""
+    return jsonify(list_caches())
+
+@main.route('/retrack/<cache_key>', methods=['POST'])
+def retrack(cache_key):
+    """Queue a re-track of cached model outputs with new settings
+
+    Runs in the inference worker (or a background thread without one), so
+    a long video never holds an HTTP worker. Poll the returned progress URL
+    and download the track file once it is done.
+    """
+    try:
+        params = request.get_json(silent=True) or {}
+        overrides = {
+            key: parse(params[key])
+            for key, parse in RETRACK_SETTINGS.items()
+            if params.get(key) is not None
+        }
+    except (TypeError, ValueError) as e:
+        logger.error(f'Invalid retrack settings: {str(e)}')
+        return jsonify({'error': 'Invalid tracking settings'}), 400
+
+    try:
+        cache_key = secure_filename(cache_key)
+        if not os.path.exists(os.path.join(get_cache_dir(cache_key), META_FILE)):
+            logger.error(f'Detection cache not found: {cache_key}')
+            return jsonify({'error': 'Detection cache not found'}), 404
+
+        # Unique per request, so re-tracks with other settings never share a file
+        tracks_filename = f'{cache_key}_{uuid.uuid4().hex[:8]}_tracks.csv'
+        tracks_path = os.path.join(Config.PROCESSED_FOLDER, tracks_filename)
+
+        if Config.INFERENCE_ADDRESS:
+            try:
+                send_request({
+                    'action': 'retrack',
+                    'cache_key': cache_key,
+                    'tracks_path': tracks_path,
+                    'overrides': overrides
+                })
+            except (OSError, EOFError) as e:
+                logger.error(f'Inference worker unavailable: {str(e)}')
+                response = jsonify({
+                    'error': 'The processing service is not available, please try again later',
+                    'retry_after': INFERENCE_RETRY_AFTER
+                })
+                response.headers['Retry-After'] = str(INFERENCE_RETRY_AFTER)
+                return response, 503
+        else:
+            queue_retrack(cache_key, tracks_path, overrides)
+
+        logger.info(f'Queued re-track of {cache_key} with {overrides}')
+        return jsonify({
+            'success': True,
+            'progress': f'/progress/{tracks_filename}',
+            'tracks': f'/processed/{tracks_filename}'
+        }), 202
+    except Exception as e:
+        logger.error(f'Error re-tracking {cache_key}: {str(e)}')
+        return jsonify({'error': str(e)}), 500
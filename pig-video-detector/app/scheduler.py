@@ -0,0 +1,249 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class FrameRequest:
+    """A frame waiting for inference"""
+
+    def __init__(self, client, frame, confidence):
+        self.client = client
+        self.frame = frame
+        self.confidence = confidence
+        self.submitted = time.monotonic()
+        self.deadline = self.submitted + client.slo_ms / 1000
+        self.future = Future()
+
+class SchedulerClient:
+    """Model handle of a single job
+
+    Called like a YOLO model, so track_video uses it unchanged: frames are
+    handed to the scheduler and the call blocks until their batch has run.
+    Each job keeps its own ByteTrack, only inference is shared.
+    """
+
+    def __init__(self, scheduler, name, slo_ms):
+        self.scheduler = scheduler
+        self.name = name
+        self.slo_ms = slo_ms
+        self.queue = deque()
+        self.latencies = []
+        self.slo_misses = 0
+
+    def __call__(self, source, verbose=False, conf=None, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        if conf is None:
+            conf = Config.MODEL_CONFIDENCE
+        futures = [self.scheduler.submit(self, frame, conf) for frame in frames]
+        return [future.result() for future in futures]
+
+    def record(self, latency):
+        """Record the latency of a frame (called by the scheduler thread)"""
+        self.latencies.append(latency)
+        if latency * 1000 > self.slo_ms:
+            self.slo_misses += 1
+
+    def report(self):
+        """Per-job latency stats"""
+        latencies = sorted(self.latencies)
+        frames = len(latencies)
+        return {
+            'frames': frames,
+            'slo_ms': self.slo_ms,
+            'slo_misses': self.slo_misses,
+            'slo_miss_rate': self.slo_misses / frames if frames else 0,
+            'latency_p50_ms': latencies[frames // 2] * 1000 if frames else 0,
+            'latency_p95_ms': latencies[min(frames - 1, int(frames * 0.95))] * 1000 if frames else 0,
+            'latency_max_ms': latencies[-1] * 1000 if frames else 0
+        }
+
+    def close(self):
+        """Unregister the job once it is done"""
+        self.scheduler.unregister(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class InferenceScheduler:
+    """Batch the frames of every running job through a single model
+
+    One thread owns the model. It waits for frames from the registered jobs
+    and runs them together once the batch is full, the oldest frame has
+    waited SCHEDULER_MAX_WAIT_MS, or waiting longer would make a job miss
+    its latency SLO. Batches are filled round-robin, one frame per job at a
+    time, with the jobs closest to their deadline first.
+    """
+
+    def __init__(self, model=None, max_batch=None, max_wait_ms=None):
+        self.model = model
+        self.max_batch = max_batch or Config.SCHEDULER_MAX_BATCH
+        self.max_wait = (Config.SCHEDULER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.condition = threading.Condition()
+        self.clients = []
+        self.thread = None
+        self.running = False
+
+        # Moving average of the inference time per frame, to budget the wait
+        self.frame_seconds = None
+        self.batches = 0
+        self.frames = 0
+        self.batch_sizes = {}
+
+    def start(self):
+        """Load the model and start the scheduler thread"""
+        if self.model is None:
+            from app.utils import get_model
+            self.model = get_model()
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name='inference-scheduler', daemon=True)
+        self.thread.start()
+        logger.info(f'Inference scheduler started (batches of up to {self.max_batch} frames)')
+        return self
+
+    def stop(self):
+        """Stop the scheduler thread after the current batch"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+        with self.condition:
+            for client in self.clients:
+                while client.queue:
+                    client.queue.popleft().future.set_exception(RuntimeError('Inference scheduler stopped'))
+
+    def register(self, name, slo_ms=None):
+        """Add a job and return the model handle it should use"""
+        client = SchedulerClient(self, name, slo_ms or Config.SCHEDULER_SLO_MS)
+        with self.condition:
+            self.clients.append(client)
+        logger.info(f'Job {name} joined the inference scheduler ({len(self.clients)} active)')
+        return client
+
+    def unregister(self, client):
+        """Remove a job, failing any of its frames still queued"""
+        with self.condition:
+            if client in self.clients:
+                self.clients.remove(client)
+            while client.queue:
+                client.queue.popleft().future.set_exception(RuntimeError(f'Job {client.name} was closed'))
+        report = client.report()
+        logger.info(
+            f"Job {client.name} left the inference scheduler: {report['frames']} frames, "
+            f"p95 latency {report['latency_p95_ms']:.0f} ms, {report['slo_misses']} SLO misses"
+        )
+
+    def submit(self, client, frame, confidence):
+        """Queue a frame of a job, returns a Future of its YOLO result"""
+        request = FrameRequest(client, frame, confidence)
+        with self.condition:
+            if not self.running:
+                raise RuntimeError('Inference scheduler is not running')
+            client.queue.append(request)
+            self.condition.notify()
+        return request.future
+
+    def _queued(self):
+        return sum(len(client.queue) for client in self.clients)
+
+    def _wait_until(self, queued):
+        """Latest time the next batch can start"""
+        heads = [client.queue[0] for client in self.clients if client.queue]
+        oldest = min(request.submitted for request in heads)
+        earliest_deadline = min(request.deadline for request in heads)
+        run_time = (self.frame_seconds or 0) * min(queued + 1, self.max_batch)
+        return min(oldest + self.max_wait, earliest_deadline - run_time)
+
+    def _select(self):
+        """Take the next batch: round-robin over jobs, earliest deadline first"""
+        batch = []
+        while len(batch) < self.max_batch:
+            waiting = sorted(
+                (client for client in self.clients if client.queue),
+                key=lambda client: client.queue[0].deadline
+            )
+            if not waiting:
+                break
+            for client in waiting[:self.max_batch - len(batch)]:
+                batch.append(client.queue.popleft())
+        return batch
+
+    def _collect(self):
+        """Wait until a batch is due and take it"""
+        with self.condition:
+            while self.running and self._queued() == 0:
+                self.condition.wait()
+            while self.running:
+                queued = self._queued()
+                if queued >= self.max_batch:
+                    break
+                if all(client.queue for client in self.clients):
+                    # Every job is waiting on us, no more frames are coming
+                    break
+                remaining = self._wait_until(queued) - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return self._select() if self.running else []
+
+    def _run(self, batch):
+        """Run a batch and hand each job its own result"""
+        # One confidence for the whole batch, stricter jobs filter their result
+        confidence = min(request.confidence for request in batch)
+        start_time = time.monotonic()
+        try:
+            results = self.model([request.frame for request in batch], verbose=False, conf=confidence)
+        except Exception as e:
+            logger.error(f'Error running inference batch: {str(e)}')
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        elapsed = time.monotonic() - start_time
+        per_frame = elapsed / len(batch)
+        self.frame_seconds = per_frame if self.frame_seconds is None else 0.8 * self.frame_seconds + 0.2 * per_frame
+        self.batches += 1
+        self.frames += len(batch)
+        self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+        done = time.monotonic()
+        for request, result in zip(batch, results):
+            if request.confidence > confidence:
+                result = result[result.boxes.conf >= request.confidence]
+            request.client.record(done - request.submitted)
+            request.future.set_result(result)
+
+    def _loop(self):
+        while self.running:
+            batch = self._collect()
+            if batch:
+                self._run(batch)
+
+    def report(self):
+        """Scheduler-wide batching stats"""
+        return {
+            'active_jobs': len(self.clients),
+            'batches': self.batches,
+            'frames': self.frames,
+            'mean_batch_size': self.frames / self.batches if self.batches else 0,
+            'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            'frame_ms': (self.frame_seconds or 0) * 1000
+        }
+
+scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Get or start the process-wide inference scheduler"""
+    global scheduler
+    with _scheduler_lock:
+        if scheduler is None:
+            scheduler = InferenceScheduler().start()
+    return scheduler
@@ -17,6 +17,9 @@ document.addEventListener('DOMContentLoaded', function() {
     const errorMessage = document.getElementById('error-message');
     const uploadButton = document.getElementById('upload-button');
     const uploadText = document.getElementById('upload-text');
+    const previewArea = document.getElementById('preview-area');
+    const previewCount = document.getElementById('preview-count');
+    const previewThumbnails = document.getElementById('preview-thumbnails');
 
     // Configuration
     const config = {
@@ -24,7 +27,9 @@ document.addEventListener('DOMContentLoaded', function() {
         maxSize: 100 * 1024 * 1024, // 100MB
         progressInterval: 1000, // Check progress every second
         maxRetries: 3, // Maximum number of retries for progress checks
-        errorDisplayTime: 5000 // How long to show error messages (ms)
+        errorDisplayTime: 5000, // How long to show error messages (ms)
+        previewInterval: 1000, // Check the preview every second
+        maxPreviewChecks: 60 // Give up on the preview after a minute
     };
 
     // State
@@ -34,13 +39,21 @@ document.addEventListener('DOMContentLoaded', function() {
         lastProgress: 0,
         retryCount: 0,
         startTime: null,
-        fileSize: 0
+        fileSize: 0,
+        etaSeconds: null, // Server estimate, counting the jobs queued ahead
+        progressUrl: null, // Progress of this upload's job
+        previewChecker: null
     };
 
     function estimateRemainingTime(progress) {
-        if (!state.startTime || progress <= 0) return null;
-        
+        if (!state.startTime) return null;
+
         const elapsedSeconds = (Date.now() - state.startTime) / 1000;
+        if (progress <= 0) {
+            // Not started yet: use the server's ETA
+            if (state.etaSeconds === null) return null;
+            return Math.max(1, Math.ceil((state.etaSeconds - elapsedSeconds) / 60));
+        }
         const progressPercent = progress / 100;
         
         if (progressPercent === 0) return null;
@@ -184,7 +197,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     async function checkProgress() {
         try {
-            const response = await fetch('/progress');
+            const response = await fetch(state.progressUrl);
             if (!response.ok) {
                 throw new Error('Progress check failed');
             }
@@ -192,7 +205,16 @@ document.addEventListener('DOMContentLoaded', function() {
             const data = await response.json();
             console.log('Progress update:', data);
 
-            if (data.progress != null) {
+            if (data.status === 'error') {
+                showError('Video processing failed. Please try again.');
+                cleanup();
+                enableUploadInterface();
+                return;
+            }
+
+            if (data.status === 'queued') {
+                progressStatus.textContent = 'Waiting in queue...';
+            } else if (data.progress != null) {
                 const progress = Math.max(state.lastProgress, data.progress);
                 state.lastProgress = progress;
                 updateProgress(progress);
@@ -217,6 +239,50 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    function showPreview(data) {
+        previewThumbnails.innerHTML = '';
+        data.thumbnails.forEach(thumbnail => {
+            const img = document.createElement('img');
+            img.src = thumbnail.url;
+            img.alt = `Frame at ${thumbnail.time}s`;
+            img.className = 'rounded-lg shadow-sm w-full';
+            previewThumbnails.appendChild(img);
+        });
+        previewCount.textContent = `Approx. ${data.count} pigs detected (preview)`;
+        previewArea.classList.remove('hidden');
+    }
+
+    function startPreviewMonitoring(previewUrl) {
+        stopPreviewMonitoring();
+        let checks = 0;
+
+        state.previewChecker = setInterval(async () => {
+            checks++;
+            try {
+                const response = await fetch(previewUrl);
+                const data = await response.json();
+
+                if (data.status === 'ready') {
+                    showPreview(data);
+                    stopPreviewMonitoring();
+                } else if (data.status !== 'pending' || checks >= config.maxPreviewChecks) {
+                    // The preview is optional, the full processing goes on
+                    stopPreviewMonitoring();
+                }
+            } catch (error) {
+                console.error('Error checking preview:', error);
+                stopPreviewMonitoring();
+            }
+        }, config.previewInterval);
+    }
+
+    function stopPreviewMonitoring() {
+        if (state.previewChecker) {
+            clearInterval(state.previewChecker);
+            state.previewChecker = null;
+        }
+    }
+
     function startProgressMonitoring() {
         if (state.progressChecker) {
             clearInterval(state.progressChecker);
@@ -258,8 +324,11 @@ document.addEventListener('DOMContentLoaded', function() {
         progressStatus.textContent = '';
         progressText.textContent = '';
         
-        // Ocultar áreas de progreso y descarga
+        // Ocultar áreas de progreso, vista previa y descarga
+        stopPreviewMonitoring();
         progressArea.classList.add('hidden');
+        previewArea.classList.add('hidden');
+        previewThumbnails.innerHTML = '';
         downloadArea.classList.add('hidden');
         
         // Limpiar el input de archivo
@@ -271,6 +340,8 @@ document.addEventListener('DOMContentLoaded', function() {
         state.retryCount = 0;
         state.startTime = null;
         state.fileSize = 0;
+        state.etaSeconds = null;
+        state.progressUrl = null;
     }
 
     function finishProcessing() {
@@ -319,20 +390,31 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: formData
             });
 
-            if (!response.ok) {
-                throw new Error(`Upload failed: ${response.statusText}`);
+            const data = await response.json().catch(() => ({}));
+
+            if (response.status === 429) {
+                // The server deferred the job, it tells us when to come back
+                const minutes = Math.ceil((data.retry_after || 60) / 60);
+                throw new Error(`Server busy, please try again in about ${minutes} min.`);
             }
 
-            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || `Upload failed: ${response.statusText}`);
+            }
             
             if (data.error) {
                 throw new Error(data.error);
             }
 
             if (data.processed_video) {
+                state.etaSeconds = data.eta_seconds || null;
+                state.progressUrl = data.progress;
                 downloadLink.href = data.processed_video;
                 downloadLink.download = `processed_${file.name}`;
                 startProgressMonitoring();
+                if (data.preview) {
+                    startPreviewMonitoring(data.preview);
+                }
             } else {
                 throw new Error('No processed video URL received');
             }
@@ -0,0 +1,289 @@
+import os
+import time
+import heapq
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class Artifact:
+    """A file or folder managed by the storage index"""
+
+    __slots__ = ('path', 'kind', 'size', 'owner', 'last_access')
+
+    def __init__(self, path, kind, size, owner, last_access):
+        self.path = path
+        self.kind = kind
+        self.size = size
+        self.owner = owner
+        self.last_access = last_access
+
+def path_size(path):
+    """Size in bytes of a file, or of every file in a folder"""
+    if os.path.isdir(path):
+        total = 0
+        for folder, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(folder, name))
+                except OSError:
+                    pass
+        return total
+    return os.path.getsize(path)
+
+class StorageManager:
+    """Index of uploads, outputs, track files, detection caches, previews and checkpoints
+
+    Keeps size, owner job and last access time of every artifact, so the
+    janitor never has to list the folders. Artifacts are evicted least
+    recently used first when the total size is over STORAGE_QUOTA_MB, or
+    when they have not been used for CLEANUP_INTERVAL hours. The LRU order
+    is a heap with lazy invalidation: a touch pushes a new entry and stale
+    ones are dropped when they reach the top, so every decision is
+    O(log n). Pinned paths (inputs, outputs and checkpoints of running
+    jobs) are never evicted.
+    """
+
+    def __init__(self, quota_mb=None, max_age_hours=None):
+        self.quota = (Config.STORAGE_QUOTA_MB if quota_mb is None else quota_mb) * 1024 * 1024
+        self.max_age = (Config.CLEANUP_INTERVAL if max_age_hours is None else max_age_hours) * 3600
+        self.lock = threading.RLock()
+        self.artifacts = {}
+        self.heap = []
+        self.pins = {}
+        self.doomed = set()
+        self.total_bytes = 0
+        self.janitor = None
+        self.stopped = threading.Event()
+
+    def add(self, path, kind, owner=None, last_access=None):
+        """Index a new artifact, or refresh the size of a known one"""
+        try:
+            size = path_size(path)
+        except OSError as e:
+            logger.error(f'Error indexing {path}: {str(e)}')
+            return
+
+        path = os.path.abspath(path)
+        last_access = last_access or time.time()
+        with self.lock:
+            artifact = self.artifacts.get(path)
+            if artifact is not None:
+                self.total_bytes -= artifact.size
+                artifact.size = size
+                artifact.owner = owner or artifact.owner
+                artifact.last_access = last_access
+            else:
+                artifact = Artifact(path, kind, size, owner, last_access)
+                self.artifacts[path] = artifact
+            self.total_bytes += size
+            self._push(artifact)
+
+    def touch(self, path):
+        """Mark an artifact as just used"""
+        with self.lock:
+            artifact = self.artifacts.get(os.path.abspath(path))
+            if artifact is not None:
+                artifact.last_access = time.time()
+                self._push(artifact)
+
+    def discard(self, path):
+        """Forget an artifact that was deleted by someone else"""
+        with self.lock:
+            artifact = self.artifacts.pop(os.path.abspath(path), None)
+            if artifact is not None:
+                self.total_bytes -= artifact.size
+
+    def _push(self, artifact):
+        heapq.heappush(self.heap, (artifact.last_access, artifact.path))
+        if len(self.heap) > 2 * len(self.artifacts) + 64:
+            # Too many stale entries, rebuild from the live artifacts
+            self.heap = [(a.last_access, a.path) for a in self.artifacts.values()]
+            heapq.heapify(self.heap)
+
+    def pin(self, path):
+        """Protect a path from eviction until unpinned"""
+        path = os.path.abspath(path)
+        with self.lock:
+            self.pins[path] = self.pins.get(path, 0) + 1
+
+    def unpin(self, path):
+        """Release a pin; the path counts as used now"""
+        path = os.path.abspath(path)
+        with self.lock:
+            count = self.pins.get(path, 0) - 1
+            if count > 0:
+                self.pins[path] = count
+            else:
+                self.pins.pop(path, None)
+                if path in self.doomed:
+                    self._remove(path)
+                    return
+            self.touch(path)
+
+    def remove_when_unpinned(self, path):
+        """Delete a file now, or when its last pin is released (a preview may still read it)"""
+        path = os.path.abspath(path)
+        with self.lock:
+            if self.pins.get(path, 0) > 0:
+                self.doomed.add(path)
+                return False
+            self._remove(path)
+            return True
+
+    def _remove(self, path):
+        self.doomed.discard(path)
+        self.discard(path)
+        try:
+            os.remove(path)
+            logger.info(f'Cleaned up file: {path}')
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f'Error cleaning up file {path}: {str(e)}')
+
+    @contextmanager
+    def pinned(self, *paths):
+        """Pin paths for the duration of a with block"""
+        paths = [path for path in paths if path]
+        for path in paths:
+            self.pin(path)
+        try:
+            yield
+        finally:
+            for path in paths:
+                self.unpin(path)
+
+    def _delete(self, artifact):
+        try:
+            if os.path.isdir(artifact.path):
+                shutil.rmtree(artifact.path)
+            else:
+                os.remove(artifact.path)
+            logger.info(f'Evicted {artifact.kind} {artifact.path} ({artifact.size / (1024 * 1024):.1f} MB)')
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f'Error removing {artifact.path}: {str(e)}')
+            return False
+        return True
+
+    def enforce(self, now=None, max_age_hours=None):
+        """Evict artifacts until under the quota and none is too old, returns the evicted paths"""
+        now = now or time.time()
+        max_age = self.max_age if max_age_hours is None else max_age_hours * 3600
+        evicted = []
+        skipped = []
+        with self.lock:
+            while self.heap:
+                last_access, path = self.heap[0]
+                artifact = self.artifacts.get(path)
+                if artifact is None or artifact.last_access != last_access:
+                    heapq.heappop(self.heap)
+                    continue
+
+                over_quota = self.quota > 0 and self.total_bytes > self.quota
+                expired = max_age > 0 and now - last_access > max_age
+                if not (over_quota or expired):
+                    break
+
+                heapq.heappop(self.heap)
+                if path in self.pins:
+                    skipped.append((last_access, path))
+                    continue
+                if self._delete(artifact):
+                    del self.artifacts[path]
+                    self.total_bytes -= artifact.size
+                    evicted.append(path)
+
+            for entry in skipped:
+                heapq.heappush(self.heap, entry)
+
+        if self.quota > 0 and self.total_bytes > self.quota:
+            logger.warning(
+                f'Storage over quota with only pinned files left: '
+                f'{self.total_bytes / (1024 * 1024):.1f} MB of {self.quota / (1024 * 1024):.0f} MB'
+            )
+        return evicted
+
+    def scan(self):
+        """Index the artifacts already on disk (once, at startup)"""
+        folders = [
+            (Config.UPLOAD_FOLDER, 'upload'),
+            (Config.PROCESSED_FOLDER, 'output'),
+            (Config.DETECTION_CACHE_FOLDER, 'cache'),
+            (Config.PREVIEW_FOLDER, 'preview'),
+            (Config.CHECKPOINT_FOLDER, 'checkpoint'),
+            (Config.PROGRESS_FOLDER, 'progress')
+        ]
+        for folder, kind in folders:
+            if not os.path.exists(folder):
+                continue
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                if name.startswith('.') or name.endswith('.partial'):
+                    continue
+                if kind == 'output' and name.endswith('.csv'):
+                    self.add(path, 'tracks', last_access=os.path.getmtime(path))
+                else:
+                    self.add(path, kind, last_access=os.path.getmtime(path))
+        logger.info(f'Storage index: {len(self.artifacts)} artifacts, {self.total_bytes / (1024 * 1024):.1f} MB')
+
+    def usage(self):
+        """Indexed size per kind of artifact"""
+        with self.lock:
+            usage = {'total_bytes': self.total_bytes, 'quota_bytes': self.quota, 'artifacts': len(self.artifacts)}
+            for artifact in self.artifacts.values():
+                usage[f'{artifact.kind}_bytes'] = usage.get(f'{artifact.kind}_bytes', 0) + artifact.size
+            return usage
+
+    def _janitor_loop(self, interval):
+        while not self.stopped.wait(interval):
+            try:
+                self.enforce()
+            except Exception as e:
+                logger.error(f'Error in storage janitor: {str(e)}')
+
+    def start_janitor(self, interval=None):
+        """Enforce the quota and max age periodically in a background thread"""
+        interval = interval or Config.STORAGE_JANITOR_INTERVAL
+        self.janitor = threading.Thread(target=self._janitor_loop, args=(interval,), name='storage-janitor', daemon=True)
+        self.janitor.start()
+        logger.info(f'Storage janitor started (every {interval}s)')
+
+    def stop_janitor(self):
+        self.stopped.set()
+        if self.janitor:
+            self.janitor.join()
+
+storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Get or build the storage index of this process"""
+    global storage
+    with _storage_lock:
+        if storage is None:
+            storage = StorageManager()
+            storage.scan()
+    return storage
+
+def notify_storage(action, path, kind=None, owner=None):
+    """Record an access ('touch') or a new artifact ('add') from a web request
+
+    With an inference worker the index lives in that process, so the
+    update is forwarded to it.
+    """
+    try:
+        if Config.INFERENCE_ADDRESS:
+            from app.inference_worker import send_request
+            send_request({'action': 'storage', 'op': action, 'path': path, 'kind': kind, 'owner': owner})
+        elif action == 'touch':
+            get_storage().touch(path)
+        else:
+            get_storage().add(path, kind, owner)
+    except Exception as e:
+        logger.error(f'Error updating storage index for {path}: {str(e)}')
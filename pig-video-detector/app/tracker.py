@@ -0,0 +1,25 @@
+import threading
+import supervision as sv
+from supervision.tracker.byte_tracker.basetrack import BaseTrack
+
+# ByteTrack draws track ids from a class-level counter shared by every tracker
+_id_lock = threading.Lock()
+
+class JobTracker(sv.ByteTrack):
+    """ByteTrack with its own track id counter
+
+    Concurrent jobs in the same process would otherwise interleave track ids
+    and reset each other's counter. The shared counter is swapped in only
+    for the duration of an update.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.track_count = 0
+
+    def update_with_tensors(self, tensors):
+        with _id_lock:
+            BaseTrack._count = self.track_count
+            tracks = super().update_with_tensors(tensors)
+            self.track_count = BaseTrack._count
+        return tracks
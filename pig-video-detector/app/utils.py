@@ -1,172 +1,147 @@
 import os
+import csv
+import sys
 import json
 import time
-import supervision as sv
-from ultralytics import YOLO
-import numpy as np
-import cv2
+import queue
 import logging
-from datetime import datetime, timedelta
+import itertools
+import threading
 from app.config import Config
+from app.cascade import CascadeModel, create_cascade_model
+from app.detection_cache import DetectionCache, DetectionCacheWriter, get_cache_dir, get_cache_key
+from app.encoder import open_video_sink, ffmpeg_available
+from app.scheduler import SchedulerClient, get_scheduler
+from app.storage import get_storage
+from app.admission import admit_job, get_admission, job_model_name, job_slots
+from app.checkpoint import JobCheckpoint, get_checkpoint_dir, can_resume, remove_checkpoint, find_interrupted_jobs
 
 logger = logging.getLogger(__name__)
 
-# Initialize YOLO model
+# The ML stack (torch, ultralytics, supervision, cv2, numpy) is imported inside
+# the processing functions only, so serving pages and progress stays cheap
+
+# Columns of the CSV track files written by track_video
+TRACK_FIELDS = ['frame', 'tracker_id', 'x1', 'y1', 'x2', 'y2', 'confidence', 'class_id']
+
+# Initialize YOLO models
 model = None
+small_model = None
 
-def get_model():
-    """Get or initialize the YOLO model for inference"""
-    global model
-    if model is None:
-        try:
-            logger.info(f"Loading model from {Config.MODEL_PATH}")
-            
-            # Verificar que el archivo existe
-            if not os.path.exists(Config.MODEL_PATH):
-                raise FileNotFoundError(f"Model file not found at: {Config.MODEL_PATH}")
-                
-            # Verificar que el archivo es accesible
-            if not os.access(Config.MODEL_PATH, os.R_OK):
-                raise PermissionError(f"Cannot read model file at: {Config.MODEL_PATH}")
-                
-            # Verificar el tamaño del archivo
-            file_size = os.path.getsize(Config.MODEL_PATH)
-            if file_size < 1000000:  # menos de 1MB probablemente no es un modelo válido
-                raise ValueError(f"Model file seems too small: {file_size} bytes")
-                
-            logger.info(f"Model file verified: {Config.MODEL_PATH} ({file_size} bytes)")
-            
-            # Cargar el modelo
-            model = YOLO(Config.MODEL_PATH)
-            model.fuse()
-            
-            # Verificar que el modelo se cargó correctamente
-            if not hasattr(model, 'predict'):
-                raise ValueError("Model loaded but seems invalid (no predict method)")
-                
-            logger.info("Model loaded and verified successfully")
-            
-        except Exception as e:
-            logger.error(f"Error loading model: {str(e)}")
-            raise
-    return model
+def load_model(model_path):
+    """Verify and load a YOLO model from disk"""
+    from ultralytics import YOLO
 
-def process_video(source_path, target_path):
-    """Process video file and detect animals"""
     try:
-        logger.info(f'Processing video: {source_path}')
+        logger.info(f"Loading model from {model_path}")
         
-        # Get video info
-        cap = cv2.VideoCapture(source_path)
-        if not cap.isOpened():
-            raise ValueError("Could not open video file")
+        # Verificar que el archivo existe
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found at: {model_path}")
             
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        processed_frames = 0
-        cap.release()
-
-        # Initialize detector
-        model = get_model()
-        byte_tracker = sv.ByteTrack()
-        box_annotator = sv.BoxAnnotator(thickness=4)
-
-        def process_callback(frame: np.ndarray, index: int) -> np.ndarray:
-            nonlocal processed_frames
-            processed_frames += 1
+        # Verificar que el archivo es accesible
+        if not os.access(model_path, os.R_OK):
+            raise PermissionError(f"Cannot read model file at: {model_path}")
             
-            # Update progress every few frames
-            if processed_frames % 10 == 0:
-                progress = min(95, (processed_frames / total_frames) * 100)
-                save_progress(progress)
-                logger.debug(f'Progress: {progress:.2f}%')
-
-            try:
-                # Model prediction
-                results = model(frame, verbose=False)[0]
-                
-                # Convert results
-                detections = sv.Detections(
-                    xyxy=results.boxes.xyxy.cpu().numpy(),
-                    confidence=results.boxes.conf.cpu().numpy(),
-                    class_id=results.boxes.cls.cpu().numpy().astype(int)
-                )
-                
-                # Filter detections
-                mask = np.isin(detections.class_id, Config.SELECTED_CLASSES)
-                detections = detections[mask]
-                
-                # Update tracking
-                detections = byte_tracker.update_with_detections(detections)
-                
-                # Annotate frame
-                annotated_frame = frame.copy()
-                if len(detections) > 0:
-                    labels = [f"Pig #{int(id)}" for id in detections.tracker_id]
-                    annotated_frame = box_annotator.annotate(
-                        scene=annotated_frame, 
-                        detections=detections,
-                        labels=labels
-                    )
-                
-                return draw_text_annotations(annotated_frame, detections)
+        # Verificar el tamaño del archivo
+        file_size = os.path.getsize(model_path)
+        if file_size < 1000000:  # menos de 1MB probablemente no es un modelo válido
+            raise ValueError(f"Model file seems too small: {file_size} bytes")
             
-            except Exception as e:
-                logger.error(f'Error processing frame {index}: {str(e)}')
-                return frame
-
-        # Process video
-        sv.process_video(
-            source_path=source_path,
-            target_path=target_path,
-            callback=process_callback
-        )
+        logger.info(f"Model file verified: {model_path} ({file_size} bytes)")
         
-        # Verify processing was successful
-        if not os.path.exists(target_path):
-            raise Exception("Processing failed - output file not created")
+        # Cargar el modelo
+        loaded_model = YOLO(model_path)
+        loaded_model.fuse()
+        
+        # Verificar que el modelo se cargó correctamente
+        if not hasattr(loaded_model, 'predict'):
+            raise ValueError("Model loaded but seems invalid (no predict method)")
             
-        logger.info('Video processing completed successfully')
-        save_progress(100)
+        logger.info("Model loaded and verified successfully")
+        return loaded_model
         
     except Exception as e:
-        logger.error(f'Error processing video: {str(e)}')
-        save_progress(0)
+        logger.error(f"Error loading model: {str(e)}")
         raise
 
-def save_progress(progress):
-    """Save current processing progress to file"""
+def get_model():
+    """Get or initialize the YOLO model for inference"""
+    global model
+    if model is None:
+        model = load_model(Config.MODEL_PATH)
+    return model
+
+def get_small_model():
+    """Get or initialize the small YOLO model used first by the cascade"""
+    global small_model
+    if small_model is None:
+        small_model = load_model(Config.CASCADE_SMALL_MODEL_PATH)
+    return small_model
+
+def get_progress_path(job_id):
+    """File holding the progress of a job (keyed by its output filename)"""
+    if os.path.basename(job_id) != job_id:
+        raise ValueError(f'Invalid job id: {job_id}')
+    return os.path.join(Config.PROGRESS_FOLDER, f'{job_id}.json')
+
+def save_progress(job_id, progress, status='running', error=None):
+    """Atomically save a job's progress and status (queued, running, done or error)"""
     try:
-        progress_file = 'progress.json'
+        os.makedirs(Config.PROGRESS_FOLDER, exist_ok=True)
+        progress_file = get_progress_path(job_id)
         progress = min(100, max(0, float(progress)))
-        with open(progress_file, 'w') as f:
-            json.dump({
-                'progress': progress,
-                'timestamp': time.time()
-            }, f)
-        logger.debug(f'Progress saved: {progress}%')
+        data = {'progress': progress, 'status': status, 'timestamp': time.time()}
+        if error:
+            data['error'] = error
+        with open(f'{progress_file}.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(f'{progress_file}.tmp', progress_file)
+        logger.debug(f'Progress of {job_id} saved: {progress}% ({status})')
     except Exception as e:
         logger.error(f"Error saving progress: {str(e)}")
 
-def get_progress():
-    """Get current processing progress from file"""
+def get_progress(job_id):
+    """Get a job's progress and status, None if the job is unknown"""
     try:
-        progress_file = 'progress.json'
-        if os.path.exists(progress_file):
-            with open(progress_file, 'r') as f:
-                data = json.load(f)
-                return {'progress': data.get('progress', 0)}
-        return {'progress': 0}
+        progress_file = get_progress_path(job_id)
+        if not os.path.exists(progress_file):
+            return None
+        with open(progress_file, 'r') as f:
+            data = json.load(f)
+        progress = {'progress': data.get('progress', 0), 'status': data.get('status', 'running')}
+        if 'error' in data:
+            progress['error'] = data['error']
+        return progress
     except Exception as e:
-        logger.error(f'Error reading progress: {str(e)}')
-        return {'progress': 0}
+        logger.error(f'Error reading progress of {job_id}: {str(e)}')
+        return None
+
+def progress_reporter(job_id, interval=1.0):
+    """Build a track_video progress_callback saving the job's progress every interval seconds"""
+    last_update = time.time()
+
+    def progress_callback(processed_frames, total_frames):
+        nonlocal last_update
+        current_time = time.time()
+        if current_time - last_update >= interval:
+            progress = min(95, (processed_frames / total_frames) * 100)
+            save_progress(job_id, progress)
+            last_update = current_time
+            logger.debug(f'Progress of {job_id}: {progress:.2f}%')
+
+    return progress_callback
 
 def allowed_file(filename):
     """Check if a filename has an allowed extension"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
-def draw_text_annotations(frame: np.ndarray, detections) -> np.ndarray:
+def draw_text_annotations(frame: 'np.ndarray', detections) -> 'np.ndarray':
     """Draw the current frame's animal count and individual labels"""
+    import cv2
+    import numpy as np
+
     try:
         # Draw total count
         position = (30, 50)
@@ -214,143 +189,612 @@ def draw_text_annotations(frame: np.ndarray, detections) -> np.ndarray:
         logger.error(f"Error drawing annotations: {str(e)}")
         return frame
 
-def process_video(source_path, target_path):
-    """Process video file and detect animals"""
-    logger.info(f'Starting video processing: {source_path} -> {target_path}')
-    
-    try:
-        # Reset progress
-        save_progress(0)
-        
-        if not os.path.exists(source_path):
-            raise FileNotFoundError(f'Source file not found: {source_path}')
-        
-        # Get video info
-        cap = cv2.VideoCapture(source_path)
-        if not cap.isOpened():
-            raise ValueError(f'Could not open video: {source_path}')
-        
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        cap.release()
+def tracking_settings(**overrides):
+    """Filtering and tracking parameters, from Config unless overridden"""
+    settings = {
+        'model_confidence': Config.MODEL_CONFIDENCE,
+        'selected_classes': Config.SELECTED_CLASSES,
+        'track_thresh': Config.TRACK_THRESH,
+        'track_buffer': Config.TRACK_BUFFER,
+        'match_thresh': Config.MATCH_THRESH,
+        'frame_rate': Config.FRAME_RATE
+    }
+    for key, value in overrides.items():
+        if key not in settings:
+            raise ValueError(f'Unknown tracking setting: {key}')
+        if value is not None:
+            settings[key] = value
+    return settings
 
-        if total_frames <= 0:
-            raise ValueError('Invalid video file: no frames detected')
+def create_tracker(settings=None):
+    """Create a ByteTrack tracker with the configured parameters"""
+    from app.tracker import JobTracker
 
-        # Initialize model and tracker
-        model = get_model()
-        byte_tracker = sv.ByteTrack(
-            track_thresh=Config.TRACK_THRESH,
-            track_buffer=Config.TRACK_BUFFER,
-            match_thresh=Config.MATCH_THRESH,
-            frame_rate=Config.FRAME_RATE
+    settings = settings or tracking_settings()
+    # Every tracker counts its own ids, so each video starts at #1 even
+    # while other jobs are running
+    return JobTracker(
+        track_thresh=settings['track_thresh'],
+        track_buffer=settings['track_buffer'],
+        match_thresh=settings['match_thresh'],
+        frame_rate=settings['frame_rate']
+    )
+
+def predict_frame(model, frame, confidence=None):
+    """Run the model on a frame and return the raw (xyxy, confidence, class_id)"""
+    if confidence is None:
+        confidence = Config.MODEL_CONFIDENCE
+    results = model(frame, verbose=False, conf=confidence)[0]
+    return (
+        results.boxes.xyxy.cpu().numpy(),
+        results.boxes.conf.cpu().numpy(),
+        results.boxes.cls.cpu().numpy().astype(int)
+    )
+
+def filter_detections(xyxy, confidence, class_id, settings=None):
+    """Keep the selected classes (pigs) above the model confidence"""
+    import numpy as np
+    import supervision as sv
+
+    settings = settings or tracking_settings()
+    detections = sv.Detections(
+        xyxy=np.asarray(xyxy, dtype=np.float32),
+        confidence=np.asarray(confidence, dtype=np.float32),
+        class_id=np.asarray(class_id, dtype=int)
+    )
+    mask = (
+        np.isin(detections.class_id, settings['selected_classes'])
+        & (detections.confidence >= settings['model_confidence'])
+    )
+    return detections[mask]
+
+def detect_frame(model, frame, settings=None):
+    """Run the model on a frame and keep only the selected classes"""
+    settings = settings or tracking_settings()
+    raw = predict_frame(model, frame, settings['model_confidence'])
+    return filter_detections(*raw, settings=settings)
+
+def annotate_frame(frame, detections, box_annotator):
+    """Draw tracked boxes, labels and the animal count on a copy of the frame"""
+    annotated_frame = frame.copy()
+    if len(detections) > 0:
+        labels = [
+            f"Pig #{int(tracker_id)}"
+            for tracker_id in detections.tracker_id
+        ]
+
+        annotated_frame = box_annotator.annotate(
+            scene=annotated_frame,
+            detections=detections,
+            labels=labels
         )
-        box_annotator = sv.BoxAnnotator(thickness=4)
 
-        processed_frames = 0
-        last_progress_update = time.time()
+    return draw_text_annotations(annotated_frame, detections)
 
-        def callback(frame: np.ndarray, index: int) -> np.ndarray:
-            nonlocal processed_frames, last_progress_update
-            processed_frames += 1
-            
-            # Update progress every second
-            current_time = time.time()
-            if current_time - last_progress_update >= 1.0:
-                progress = min(95, (processed_frames / total_frames) * 100)
-                save_progress(progress)
-                last_progress_update = current_time
-                logger.debug(f'Processing progress: {progress:.2f}%')
-            
+def track_rows(frame_index, detections):
+    """Convert the tracked detections of a frame into track file rows"""
+    return [
+        [
+            frame_index,
+            int(tracker_id),
+            *(f'{value:.2f}' for value in xyxy),
+            f'{confidence:.4f}',
+            int(class_id)
+        ]
+        for xyxy, confidence, class_id, tracker_id in zip(
+            detections.xyxy, detections.confidence,
+            detections.class_id, detections.tracker_id
+        )
+    ]
+
+def render_tracks(source_path, tracks_path, sink, end_frame, box_annotator):
+    """Draw the frames before end_frame again from a track file, without inference"""
+    import numpy as np
+    import supervision as sv
+
+    with open(tracks_path, 'r', newline='') as f:
+        groups = itertools.groupby(csv.DictReader(f), key=lambda row: int(row['frame']))
+        group = next(groups, None)
+        for index, frame in enumerate(sv.get_video_frames_generator(source_path, end=end_frame)):
+            rows = []
+            if group is not None and group[0] == index:
+                rows = list(group[1])
+                group = next(groups, None)
+            detections = sv.Detections(
+                xyxy=np.array(
+                    [[float(row[key]) for key in ('x1', 'y1', 'x2', 'y2')] for row in rows],
+                    dtype=np.float32
+                ).reshape(-1, 4),
+                confidence=np.array([float(row['confidence']) for row in rows], dtype=np.float32),
+                class_id=np.array([int(row['class_id']) for row in rows], dtype=int),
+                tracker_id=np.array([int(row['tracker_id']) for row in rows], dtype=int)
+            )
+            sink.write_frame(annotate_frame(frame, detections, box_annotator))
+
+def track_video(source_path, target_path=None, tracks_path=None, model=None,
+                progress_callback=None, checkpoint_dir=None, settings=None,
+                cache_dir=None, replay=None):
+    """Detect and track animals in a video
+
+    Core pipeline shared by the web app and batch_process.py. Writes an
+    annotated video to target_path and/or a CSV track file to tracks_path,
+    and returns processing stats. With a checkpoint_dir the job saves a
+    checkpoint every Config.CHECKPOINT_INTERVAL frames and resumes from the
+    last one when restarted.
+
+    With a cache_dir the raw model outputs are saved there; with a replay
+    (DetectionCache) they are read back instead of running the model, and
+    the source video is only decoded if an annotated video is requested.
+    """
+    import numpy as np
+    import supervision as sv
+
+    if target_path is None and tracks_path is None:
+        raise ValueError('Nothing to write: target_path and tracks_path are both empty')
+
+    if replay is not None:
+        video_info = replay.video_info()
+    else:
+        video_info = sv.VideoInfo.from_video_path(source_path)
+    total_frames = video_info.total_frames
+    if total_frames is None or total_frames <= 0:
+        raise ValueError('Invalid video file: no frames detected')
+
+    # Initialize model and tracker
+    if model is None and replay is None:
+        model = get_model()
+    settings = settings or tracking_settings()
+    byte_tracker = create_tracker(settings)
+    box_annotator = sv.BoxAnnotator(thickness=4)
+
+    checkpoint = None
+    start_frame = 0
+    if checkpoint_dir and replay is None and Config.CHECKPOINT_INTERVAL > 0:
+        checkpoint = JobCheckpoint(checkpoint_dir, source_path, settings, target_path, tracks_path)
+        # May be a track file of its own, to re-render the video on resume
+        tracks_path = checkpoint.tracks_path
+        if checkpoint.load():
+            byte_tracker = checkpoint.tracker
+            start_frame = checkpoint.frame
+            if isinstance(model, CascadeModel) and checkpoint.model_state:
+                model.previous_count = checkpoint.model_state['previous_count']
+
+    # The cascade's choices depend on the thresholds, so its outputs are not cached.
+    # A resumed job has lost the outputs of the frames before the checkpoint.
+    cache_writer = None
+    confidence = settings['model_confidence']
+    if cache_dir and replay is None and start_frame == 0 and not isinstance(model, CascadeModel):
+        confidence = min(confidence, Config.CACHE_MIN_CONFIDENCE)
+        cache_writer = DetectionCacheWriter(cache_dir, video_info, {
+            'source': os.path.basename(source_path),
+            'model': os.path.basename(Config.MODEL_PATH),
+            'min_confidence': confidence
+        })
+
+    segment_frames = 0
+    encode_stats = {'encode_cpu_seconds': 0.0, 'blocked_seconds': 0.0}
+
+    def open_sink():
+        nonlocal segment_frames
+        segment_frames = 0
+        # Checkpointed jobs encode one segment per checkpoint interval when ffmpeg can join them
+        segmented = checkpoint is not None and checkpoint.segmented
+        sink = open_video_sink(checkpoint.segment_path() if segmented else target_path, video_info)
+        sink.__enter__()
+        return sink
+
+    def close_sink(sink, exc_info=(None, None, None)):
+        sink.__exit__(*exc_info)
+        for key in encode_stats:
+            value = getattr(sink, 'stats', {}).get(key, 0.0)
+            # None when the platform cannot measure it
+            if value is None or encode_stats[key] is None:
+                encode_stats[key] = None
+            else:
+                encode_stats[key] += value
+
+    processed_frames = start_frame
+    start_time = time.time()
+    sink = None
+    tracks_file = None
+
+    try:
+        if target_path:
+            sink = open_sink()
+
+        tracks_writer = None
+        if tracks_path:
+            if start_frame > 0:
+                # Drop the rows written after the checkpoint
+                tracks_file = open(tracks_path, 'r+', newline='')
+                tracks_file.truncate(checkpoint.tracks_offset)
+                tracks_file.seek(checkpoint.tracks_offset)
+                tracks_writer = csv.writer(tracks_file)
+            else:
+                tracks_file = open(tracks_path, 'w', newline='')
+                tracks_writer = csv.writer(tracks_file)
+                tracks_writer.writerow(TRACK_FIELDS)
+
+        if sink and start_frame > 0 and not checkpoint.segmented:
+            # The video was not kept up to the checkpoint, draw it again
+            render_tracks(source_path, tracks_path, sink, start_frame, box_annotator)
+
+        if replay is not None and not target_path:
+            # Tracks only: the cached outputs are all we need
+            frames = (None for _ in range(total_frames))
+        else:
+            frames = sv.get_video_frames_generator(source_path, start=start_frame)
+
+        for index, frame in enumerate(frames, start=start_frame):
             try:
-                # Model prediction
-                results = model(frame, verbose=False)[0]
-                
-                # Convert results to detections
-                detections = sv.Detections(
-                    xyxy=results.boxes.xyxy.cpu().numpy(),
-                    confidence=results.boxes.conf.cpu().numpy(),
-                    class_id=results.boxes.cls.cpu().numpy().astype(int)
+                if replay is not None:
+                    raw = replay.frame(index)
+                else:
+                    raw = predict_frame(model, frame, confidence)
+                    if cache_writer:
+                        cache_writer.append(*raw)
+                detections = byte_tracker.update_with_detections(
+                    filter_detections(*raw, settings=settings)
                 )
-                
-                # Filter for selected classes (pigs)
-                mask = np.isin(detections.class_id, Config.SELECTED_CLASSES)
-                detections = detections[mask]
-                
-                # Update tracking
-                detections = byte_tracker.update_with_detections(detections)
-                
-                # Annotate frame
-                annotated_frame = frame.copy()
-                if len(detections) > 0:
-                    labels = [
-                        f"Pig #{int(tracker_id)}"
-                        for tracker_id in detections.tracker_id
-                    ]
-                    
-                    annotated_frame = box_annotator.annotate(
-                        scene=annotated_frame,
-                        detections=detections,
-                        labels=labels
-                    )
-                
-                return draw_text_annotations(annotated_frame, detections)
-            
             except Exception as e:
                 logger.error(f"Error processing frame {index}: {str(e)}")
-                return frame
+                detections = None
+                if cache_writer and len(cache_writer.offsets) <= index + 1:
+                    # Keep the cache aligned with the frame numbers
+                    cache_writer.append(np.empty((0, 4)), np.empty(0), np.empty(0))
+
+            if tracks_writer and detections is not None:
+                tracks_writer.writerows(track_rows(index, detections))
+            if sink:
+                sink.write_frame(
+                    frame if detections is None
+                    else annotate_frame(frame, detections, box_annotator)
+                )
+                segment_frames += 1
+
+            processed_frames += 1
+            if checkpoint and processed_frames % Config.CHECKPOINT_INTERVAL == 0:
+                tracks_offset = 0
+                if tracks_file:
+                    tracks_file.flush()
+                    os.fsync(tracks_file.fileno())
+                    tracks_offset = tracks_file.tell()
+                if checkpoint.segmented:
+                    close_sink(sink)
+                checkpoint.save(
+                    processed_frames, byte_tracker, tracks_offset,
+                    checkpoint.segments + 1 if checkpoint.segmented else 0,
+                    model_state=(
+                        {'previous_count': model.previous_count}
+                        if isinstance(model, CascadeModel) else None
+                    )
+                )
+                if checkpoint.segmented:
+                    sink = open_sink()
 
-        # Process video with supervision
-        sv.process_video(
-            source_path=source_path,
-            target_path=target_path,
-            callback=callback
+            if progress_callback:
+                progress_callback(processed_frames, total_frames)
+    except BaseException:
+        if sink:
+            close_sink(sink, sys.exc_info())
+            sink = None
+        if cache_writer:
+            cache_writer.abort()
+        raise
+    finally:
+        if sink:
+            close_sink(sink)
+        if tracks_file:
+            tracks_file.close()
+
+    if checkpoint:
+        if checkpoint.segmented:
+            if segment_frames > 0:
+                checkpoint.segments += 1
+            checkpoint.join_segments(target_path)
+        checkpoint.remove()
+
+    if cache_writer:
+        cache_writer.close()
+
+    elapsed = time.time() - start_time
+    stats = {
+        'frames': processed_frames,
+        'resumed_from': start_frame,
+        'elapsed': elapsed,
+        'fps': (processed_frames - start_frame) / elapsed if elapsed > 0 else 0,
+        'resolution': f'{video_info.width}x{video_info.height}'
+    }
+    if isinstance(model, CascadeModel):
+        stats['cascade'] = model.report()
+    if isinstance(model, SchedulerClient):
+        stats['scheduler'] = model.report()
+    if cache_writer:
+        stats['cache_key'] = os.path.basename(cache_dir)
+    if target_path:
+        stats.update(encode_stats)
+        stats['video_bytes'] = os.path.getsize(target_path) if os.path.exists(target_path) else 0
+        stats['encoder'] = (
+            f'{Config.VIDEO_CODEC} crf={Config.VIDEO_CRF} preset={Config.VIDEO_PRESET}'
+            if ffmpeg_available() else 'opencv mp4v'
         )
+    return stats
+
+def retrack_video(cache_key, tracks_path=None, target_path=None, source_path=None,
+                  progress_callback=None, **overrides):
+    """Re-run filtering and tracking on cached model outputs, without inference
+
+    overrides are tracking_settings() keys (model_confidence, track_thresh,
+    ...). Rendering an annotated video also needs the source video.
+    """
+    if target_path and not source_path:
+        raise ValueError('Rendering an annotated video needs the source video')
+
+    replay = DetectionCache(get_cache_dir(cache_key))
+    settings = tracking_settings(**overrides)
+    if settings['model_confidence'] < replay.meta['min_confidence']:
+        logger.warning(
+            f"Cache {cache_key} only has boxes above {replay.meta['min_confidence']}, "
+            f"model_confidence={settings['model_confidence']} cannot recover lower ones"
+        )
+
+    logger.info(f'Re-tracking {cache_key} with {settings}')
+    return track_video(
+        source_path,
+        target_path,
+        tracks_path=tracks_path,
+        progress_callback=progress_callback,
+        settings=settings,
+        replay=replay
+    )
+
+def record_job_stats(source_path, stats):
+    """Append the stats of a finished job to the job stats file"""
+    try:
+        with open(Config.JOB_STATS_FILE, 'a') as f:
+            f.write(json.dumps({
+                'source': os.path.basename(source_path),
+                'timestamp': time.time(),
+                **stats
+            }) + '\n')
+    except Exception as e:
+        logger.error(f'Error recording job stats: {str(e)}')
+
+def process_video(source_path, target_path, tracks_path=None):
+    """Process video file and detect animals"""
+    logger.info(f'Starting video processing: {source_path} -> {target_path}')
+    job_id = os.path.basename(target_path)
+    
+    try:
+        # Reset progress
+        save_progress(job_id, 0)
+        
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(f'Source file not found: {source_path}')
+
+        model = None
+        if Config.CASCADE_ENABLED:
+            model = create_cascade_model()
+        elif Config.SCHEDULER_ENABLED:
+            # Batch this job's frames with the other running jobs
+            model = get_scheduler().register(os.path.basename(source_path))
+
+        try:
+            stats = track_video(
+                source_path,
+                target_path,
+                tracks_path=tracks_path,
+                model=model,
+                progress_callback=progress_reporter(job_id),
+                checkpoint_dir=get_checkpoint_dir(target_path),
+                cache_dir=(
+                    get_cache_dir(get_cache_key(source_path))
+                    if Config.DETECTION_CACHE_ENABLED else None
+                )
+            )
+        finally:
+            if isinstance(model, SchedulerClient):
+                model.close()
         
         # Verify the output file exists and has size
         if not os.path.exists(target_path) or os.path.getsize(target_path) == 0:
             raise Exception("Output video file is missing or empty")
 
+        # Index the new artifacts for the storage janitor
+        owner = os.path.basename(target_path)
+        get_storage().add(target_path, 'output', owner)
+        if tracks_path:
+            get_storage().add(tracks_path, 'tracks', owner)
+        if 'cache_key' in stats:
+            get_storage().add(get_cache_dir(stats['cache_key']), 'cache', owner)
+
         # Mark as complete
-        save_progress(100)
-        logger.info('Video processing completed successfully')
+        save_progress(job_id, 100, 'done')
+        stats['source_bytes'] = os.path.getsize(source_path)
+        stats['model'] = job_model_name()
+        record_job_stats(source_path, stats)
+        encode_cpu = (
+            'unknown' if stats['encode_cpu_seconds'] is None
+            else f"{stats['encode_cpu_seconds']:.1f}s"
+        )
+        logger.info(
+            f"Video processing completed successfully ({stats['fps']:.2f} FPS, "
+            f"{stats['video_bytes'] / (1024 * 1024):.1f} MB, "
+            f"{encode_cpu} encoding CPU)"
+        )
+        if 'cascade' in stats:
+            logger.info(
+                f"Cascade escalated {stats['cascade']['escalation_rate']:.1%} of frames "
+                f"({stats['cascade']['reasons']})"
+            )
+            if stats['cascade']['audit_agreement'] is None:
+                logger.info(f"No cascade agreement: {stats['cascade']['audit_skipped']}")
+            else:
+                logger.info(
+                    f"Cascade agreed with the main model on {stats['cascade']['audit_agreement']:.1%} "
+                    f"of {stats['cascade']['audited_frames']} audited frames"
+                )
+        if 'scheduler' in stats:
+            logger.info(
+                f"Scheduler latency p95 {stats['scheduler']['latency_p95_ms']:.0f} ms, "
+                f"{stats['scheduler']['slo_misses']} frames over the SLO"
+            )
+        return stats
 
     except Exception as e:
         logger.error(f'Error during video processing: {str(e)}')
-        save_progress(0)
+        save_progress(job_id, 0, 'error', str(e))
         
-        # Cleanup on error
-        for path in [source_path, target_path]:
-            if os.path.exists(path):
-                try:
-                    os.remove(path)
-                    logger.info(f'Cleaned up file: {path}')
-                except Exception as cleanup_error:
-                    logger.error(f'Error cleaning up file {path}: {str(cleanup_error)}')
+        # Cleanup on error, keeping the source if the job can be resumed
+        checkpoint_dir = get_checkpoint_dir(target_path)
+        if can_resume(checkpoint_dir):
+            logger.info(f'Keeping {source_path} to resume from its checkpoint')
+            get_storage().add(checkpoint_dir, 'checkpoint', os.path.basename(target_path))
+        else:
+            remove_checkpoint(checkpoint_dir)
+            get_storage().discard(checkpoint_dir)
+            # Its preview may not have read the source yet
+            get_storage().remove_when_unpinned(source_path)
+
+        get_storage().discard(target_path)
+        if os.path.exists(target_path):
+            try:
+                os.remove(target_path)
+                logger.info(f'Cleaned up file: {target_path}')
+            except Exception as cleanup_error:
+                logger.error(f'Error cleaning up file {target_path}: {str(cleanup_error)}')
         
         raise
 
+def process_video_async(input_path, output_path):
+    """Run a full processing job (from a job queue thread)"""
+    job_id = os.path.basename(output_path)
+    storage = get_storage()
+    storage.add(input_path, 'upload', job_id)
+    get_admission().start(job_id)
+    # The janitor must not evict the files of a running job
+    checkpoint_dir = get_checkpoint_dir(output_path)
+    with storage.pinned(input_path, output_path, checkpoint_dir):
+        try:
+            process_video(input_path, output_path)
+            logger.info('Video processing completed successfully')
+
+            # Cleanup input file after successful processing, once its
+            # preview (and this job) no longer pin it
+            storage.discard(checkpoint_dir)
+            storage.remove_when_unpinned(input_path)
+        except Exception as e:
+            logger.error(f'Error in async processing: {str(e)}')
+            # process_video already removed the input unless it can be resumed
+            storage.discard(output_path)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+                logger.info(f'Cleaned up file after error: {output_path}')
+        finally:
+            get_admission().finish(job_id)
+            # Kept for the page polling it, then evicted like the output
+            storage.add(get_progress_path(job_id), 'progress', job_id)
+
+# Admitted jobs wait here for one of the job_slots() runner threads
+job_queue = None
+_job_queue_lock = threading.Lock()
+
+def _job_loop(jobs):
+    """Run queued jobs one at a time (one loop per job slot)"""
+    while True:
+        input_path, output_path = jobs.get()
+        try:
+            process_video_async(input_path, output_path)
+        except Exception as e:
+            logger.error(f'Error running job {input_path}: {str(e)}')
+        finally:
+            get_storage().unpin(input_path)
+            jobs.task_done()
+
+def get_job_queue():
+    """Get or start the job queue of the process running the jobs"""
+    global job_queue
+    with _job_queue_lock:
+        if job_queue is None:
+            job_queue = queue.Queue()
+            for _ in range(job_slots()):
+                threading.Thread(target=_job_loop, args=(job_queue,), name='job-runner', daemon=True).start()
+    return job_queue
+
+def queue_job(input_path, output_path):
+    """Queue an admitted job, pinning its upload until the job has run"""
+    storage = get_storage()
+    storage.add(input_path, 'upload', os.path.basename(output_path))
+    storage.pin(input_path)
+    save_progress(os.path.basename(output_path), 0, 'queued')
+    get_job_queue().put((input_path, output_path))
+
+def run_retrack(cache_key, tracks_path, overrides):
+    """Re-track a cached video into tracks_path, reporting progress under its filename"""
+    job_id = os.path.basename(tracks_path)
+    storage = get_storage()
+    cache_dir = get_cache_dir(cache_key)
+    with storage.pinned(cache_dir):
+        try:
+            save_progress(job_id, 0)
+            stats = retrack_video(
+                cache_key,
+                tracks_path=tracks_path,
+                progress_callback=progress_reporter(job_id),
+                **overrides
+            )
+            storage.touch(cache_dir)
+            storage.add(tracks_path, 'tracks', cache_key)
+            save_progress(job_id, 100, 'done')
+            logger.info(f"Re-tracked {cache_key} in {stats['elapsed']:.2f}s")
+        except Exception as e:
+            logger.error(f'Error re-tracking {cache_key}: {str(e)}')
+            save_progress(job_id, 0, 'error', str(e))
+            if os.path.exists(tracks_path):
+                os.remove(tracks_path)
+        finally:
+            storage.add(get_progress_path(job_id), 'progress', cache_key)
+
+# Re-tracks run no model, so they get their own thread instead of a job slot
+retrack_queue = None
+_retrack_queue_lock = threading.Lock()
+
+def _retrack_loop(requests):
+    """Run queued re-tracks one at a time"""
+    while True:
+        cache_key, tracks_path, overrides = requests.get()
+        try:
+            run_retrack(cache_key, tracks_path, overrides)
+        finally:
+            requests.task_done()
+
+def get_retrack_queue():
+    """Get or start the re-track queue of the process running the jobs"""
+    global retrack_queue
+    with _retrack_queue_lock:
+        if retrack_queue is None:
+            retrack_queue = queue.Queue()
+            threading.Thread(target=_retrack_loop, args=(retrack_queue,), name='retrack', daemon=True).start()
+    return retrack_queue
+
+def queue_retrack(cache_key, tracks_path, overrides):
+    """Queue a re-track, its progress is reported under the track file's name"""
+    save_progress(os.path.basename(tracks_path), 0, 'queued')
+    get_retrack_queue().put((cache_key, tracks_path, overrides))
+
+def resume_interrupted_jobs():
+    """Queue the jobs that were interrupted after saving a checkpoint"""
+    for input_path, output_path in find_interrupted_jobs():
+        logger.info(f'Resuming interrupted job: {input_path}')
+        admit_job(os.path.basename(output_path), input_path, force=True)
+        queue_job(input_path, output_path)
+
 def cleanup_old_files(max_age_hours=None):
-    """Clean up files older than specified hours"""
-    if max_age_hours is None:
-        max_age_hours = Config.CLEANUP_INTERVAL
-        
+    """Evict indexed files not used for max_age_hours (CLEANUP_INTERVAL by default)"""
     try:
-        current_time = datetime.now()
-        for folder in [Config.UPLOAD_FOLDER, Config.PROCESSED_FOLDER]:
-            if not os.path.exists(folder):
-                continue
-            
-            logger.info(f'Cleaning up folder: {folder}')
-            for filename in os.listdir(folder):
-                file_path = os.path.join(folder, filename)
-                file_modified = datetime.fromtimestamp(os.path.getmtime(file_path))
-                if current_time - file_modified > timedelta(hours=max_age_hours):
-                    try:
-                        os.remove(file_path)
-                        logger.info(f'Removed old file: {file_path}')
-                    except Exception as e:
-                        logger.error(f'Error removing file {file_path}: {str(e)}')
-                    
+        evicted = get_storage().enforce(max_age_hours=max_age_hours)
+        logger.info(f'Cleanup removed {len(evicted)} artifacts')
+        return evicted
     except Exception as e:
-        logger.error(f'Error during cleanup: {str(e)}')
\ No newline at end of file
+        logger.error(f'Error during cleanup: {str(e)}')
+        return []
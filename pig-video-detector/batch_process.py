@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Batch processing of archived videos
+
+Processes every video matched by the given directories or glob patterns
+across a pool of processes (each loads the model once). Progress is stored
+in a manifest so an interrupted run resumes with the videos it had not
+finished yet, and each video continues from its last checkpoint.
+
+Usage:
+    python batch_process.py "archive/2024-*/*.mp4" --output-dir results --workers 2
+"""
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app.config import Config
+from app.utils import allowed_file
+
+logger = logging.getLogger('batch_process')
+
+def find_videos(inputs):
+    """Expand directories and glob patterns into a sorted list of videos"""
+    videos = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*')
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            path = os.path.abspath(path)
+            if os.path.isfile(path) and allowed_file(path) and path not in videos:
+                videos.append(path)
+    return videos
+
+def load_manifest(manifest_path):
+    """Load the checkpoint manifest of a previous run"""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(manifest_path, manifest):
+    """Atomically write the checkpoint manifest"""
+    temp_path = f'{manifest_path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, manifest_path)
+
+def output_paths(video_path, output_dir, write_video, write_tracks):
+    """Get the output paths of a video"""
+    name, extension = os.path.splitext(os.path.basename(video_path))
+    video_out = os.path.join(output_dir, f'processed_{name}{extension}') if write_video else None
+    tracks_out = os.path.join(output_dir, f'{name}_tracks.csv') if write_tracks else None
+    return video_out, tracks_out
+
+def partial_path(path):
+    """Temporary name used while an output is being written"""
+    name, extension = os.path.splitext(path)
+    return f'{name}.partial{extension}'
+
+def init_worker(model_path, threads, cascade):
+    """Load the model(s) once per worker process"""
+    import torch
+    from app.utils import get_model, get_small_model
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    torch.set_num_threads(threads)
+    Config.MODEL_PATH = model_path
+    Config.CASCADE_ENABLED = cascade
+    get_model()
+    if cascade:
+        get_small_model()
+
+def process_one(video_path, video_out, tracks_out):
+    """Process a single video in a worker process"""
+    from app.utils import track_video
+    from app.cascade import create_cascade_model
+    from app.detection_cache import get_cache_dir, get_cache_key
+
+    outputs = [path for path in (video_out, tracks_out) if path]
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    stats = track_video(
+        video_path,
+        target_path=partial_path(video_out) if video_out else None,
+        tracks_path=partial_path(tracks_out) if tracks_out else None,
+        model=create_cascade_model() if Config.CASCADE_ENABLED else None,
+        cache_dir=(
+            get_cache_dir(get_cache_key(video_path))
+            if Config.DETECTION_CACHE_ENABLED else None
+        ),
+        checkpoint_dir=os.path.join(os.path.dirname(outputs[0]), 'checkpoints', name)
+    )
+
+    # Only publish complete outputs
+    for path in outputs:
+        os.replace(partial_path(path), path)
+
+    stats['outputs'] = outputs
+    return stats
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Detect and track pigs in a batch of videos')
+    parser.add_argument('inputs', nargs='+', help='Video files, directories or glob patterns')
+    parser.add_argument('--output-dir', default='batch_output', help='Where to write the results')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes (0 processes the videos in this process)')
+    parser.add_argument('--model', default=Config.MODEL_PATH, help='Path to the YOLO weights')
+    parser.add_argument('--cascade', action='store_true',
+                        help='Run the small model first and the main model only on uncertain frames')
+    parser.add_argument('--no-video', action='store_true', help='Do not write annotated videos')
+    parser.add_argument('--no-tracks', action='store_true', help='Do not write CSV track files')
+    parser.add_argument('--manifest', help='Checkpoint manifest (default: <output-dir>/manifest.json)')
+    args = parser.parse_args(argv)
+
+    if args.no_video and args.no_tracks:
+        parser.error('--no-video and --no-tracks leave nothing to write')
+    if args.workers < 0:
+        parser.error('--workers cannot be negative')
+    if not os.path.exists(args.model):
+        parser.error(f'Model file not found: {args.model}')
+    return args
+
+def main(argv=None):
+    """Batch processing entry point"""
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.output_dir, 'manifest.json')
+    manifest = load_manifest(manifest_path)
+
+    videos = find_videos(args.inputs)
+    names = [os.path.splitext(os.path.basename(video))[0] for video in videos]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        logger.error(f'Duplicate video names would overwrite each other: {duplicates}')
+        return 1
+
+    pending = [
+        video for video in videos
+        if manifest.get(video, {}).get('status') != 'done'
+    ]
+    logger.info(f'Found {len(videos)} videos, {len(videos) - len(pending)} already done')
+    if not pending:
+        return 0
+
+    # Split the CPU between workers instead of letting each one use every core
+    threads = max(1, (os.cpu_count() or 1) // max(1, args.workers))
+    initargs = (os.path.abspath(args.model), threads, args.cascade)
+    start_time = time.time()
+    total_frames = 0
+    failed = 0
+
+    def record(video, get_stats):
+        """Store the outcome of a video in the manifest"""
+        nonlocal total_frames, failed
+        try:
+            stats = get_stats()
+            # Frames done before a checkpoint were counted by an earlier run
+            total_frames += stats['frames'] - stats['resumed_from']
+            manifest[video] = {'status': 'done', **stats}
+            logger.info(f"Done {video}: {stats['frames']} frames at {stats['fps']:.2f} FPS")
+            if 'cascade' in stats:
+                logger.info(f"Cascade escalation rate: {stats['cascade']['escalation_rate']:.1%}")
+                if stats['cascade']['audit_agreement'] is not None:
+                    logger.info(f"Cascade audit agreement: {stats['cascade']['audit_agreement']:.1%}")
+        except Exception as e:
+            failed += 1
+            manifest[video] = {'status': 'failed', 'error': str(e)}
+            logger.error(f'Error processing {video}: {str(e)}')
+        save_manifest(manifest_path, manifest)
+
+    def outputs(video):
+        return output_paths(video, args.output_dir, not args.no_video, not args.no_tracks)
+
+    if args.workers == 0:
+        # Inline mode, handy for debugging
+        init_worker(*initargs)
+        for video in pending:
+            record(video, lambda: process_one(video, *outputs(video)))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=initargs
+        ) as executor:
+            futures = {
+                executor.submit(process_one, video, *outputs(video)): video
+                for video in pending
+            }
+            for future in as_completed(futures):
+                record(futures[future], future.result)
+
+    elapsed = time.time() - start_time
+    print(f"\nVideos procesados: {len(pending) - failed}/{len(pending)} (fallidos: {failed})")
+    print(f"Frames totales: {total_frames}")
+    print(f"Tiempo total: {elapsed:.1f}s")
+    print(f"Throughput agregado: {total_frames / elapsed if elapsed > 0 else 0:.2f} FPS")
+    print(f"Manifiesto: {manifest_path}")
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Gunicorn configuration for production
+
+Usage: gunicorn -c gunicorn.conf.py wsgi:app
+
+HTTP workers only render pages, receive uploads and report progress. All video
+processing is handed to a single inference worker process started by the
+master, so the YOLO model is loaded exactly once no matter how many HTTP
+workers are configured. The master starts it again if it ever exits.
+"""
+import os
+import threading
+import multiprocessing
+
+# Every HTTP worker (and the inference worker) reads this from Config
+os.environ.setdefault('INFERENCE_ADDRESS', '/tmp/pig-inference.sock')
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', min(4, multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = True
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+# Seconds between checks that the inference worker is still running
+INFERENCE_WATCH_INTERVAL = int(os.getenv('INFERENCE_WATCH_INTERVAL', '5'))
+
+# The worker and its watcher live on the arbiter (server) because a HUP
+# reload executes this file again and would reset module globals
+
+def on_starting(server):
+    """Start the inference worker before any HTTP worker is forked"""
+    from app.inference_worker import start_inference_server
+    server.inference_stopping = threading.Event()
+    server.inference_process = start_inference_server()
+    server.log.info(f'Inference worker started (pid {server.inference_process.pid})')
+
+def watch_inference_worker(server):
+    """Start the inference worker again whenever it exits"""
+    from app.inference_worker import start_inference_server
+
+    while not server.inference_stopping.wait(INFERENCE_WATCH_INTERVAL):
+        # The master reaps every child, so the exit code is usually lost
+        if server.inference_process.poll() is not None and not server.inference_stopping.is_set():
+            server.log.error('Inference worker exited, restarting it')
+            server.inference_process = start_inference_server()
+            server.log.info(f'Inference worker started (pid {server.inference_process.pid})')
+
+def when_ready(server):
+    """Watch the inference worker from the master (not run again on reload)"""
+    threading.Thread(
+        target=watch_inference_worker,
+        args=(server,),
+        name='inference-watch',
+        daemon=True
+    ).start()
+
+def on_exit(server):
+    """Stop the inference worker together with the master"""
+    from app.inference_worker import stop_inference_server
+    server.inference_stopping.set()
+    stop_inference_server(server.inference_process)
+    server.log.info('Inference worker stopped')
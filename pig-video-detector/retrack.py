@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Re-track a processed video from its cached model outputs
+
+Only filtering and ByteTrack run again (plus rendering if requested), so
+trying new thresholds takes seconds instead of a full inference pass.
+
+Usage:
+    python retrack.py --list
+    python retrack.py <cache-key> --track-thresh 0.3 --tracks tracks.csv
+    python retrack.py --video pen3.mp4 --model-confidence 0.4 --render pen3_annotated.mp4
+"""
+import os
+import sys
+import logging
+import argparse
+from app.config import Config
+from app.detection_cache import get_cache_key, list_caches
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Re-track a video from cached model outputs')
+    parser.add_argument('cache_key', nargs='?', help='Cache key (see --list)')
+    parser.add_argument('--list', action='store_true', help='List the cached videos')
+    parser.add_argument('--video', help='Source video (finds the cache key, needed by --render)')
+    parser.add_argument('--tracks', help='CSV track file to write (default: <cache-key>_tracks.csv)')
+    parser.add_argument('--render', help='Annotated video to write')
+    parser.add_argument('--model-confidence', type=float)
+    parser.add_argument('--track-thresh', type=float)
+    parser.add_argument('--match-thresh', type=float)
+    parser.add_argument('--track-buffer', type=int)
+    parser.add_argument('--classes', type=int, nargs='+', help='Class ids to keep (default: 18 19)')
+    args = parser.parse_args(argv)
+
+    if not args.list and not args.cache_key and not args.video:
+        parser.error('a cache key or --video is required')
+    if args.render and not args.video:
+        parser.error('--render needs the source --video')
+    return args
+
+def main(argv=None):
+    """Re-track entry point"""
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if args.list:
+        for cache in list_caches():
+            print(f"{cache['key']}  {cache['source']}  {cache['frames']} frames  {cache['model']}")
+        return 0
+
+    from app.utils import retrack_video
+
+    cache_key = args.cache_key or get_cache_key(args.video)
+    tracks_path = args.tracks or f'{cache_key}_tracks.csv'
+
+    try:
+        stats = retrack_video(
+            cache_key,
+            tracks_path=tracks_path,
+            target_path=args.render,
+            source_path=args.video,
+            model_confidence=args.model_confidence,
+            track_thresh=args.track_thresh,
+            match_thresh=args.match_thresh,
+            track_buffer=args.track_buffer,
+            selected_classes=args.classes
+        )
+    except FileNotFoundError as e:
+        print(f"Error: {e}. Process the video first (cache folder: {Config.DETECTION_CACHE_FOLDER})")
+        return 1
+
+    print(f"\nFrames: {stats['frames']}")
+    print(f"Tiempo: {stats['elapsed']:.2f}s ({stats['fps']:.1f} FPS)")
+    print(f"Tracks: {os.path.abspath(tracks_path)}")
+    if args.render:
+        print(f"Video: {os.path.abspath(args.render)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -68,6 +68,14 @@ def main():
         logger.info(f'Debug mode: {debug}')
         logger.info(f'Upload folder: {app.config["UPLOAD_FOLDER"]}')
         logger.info(f'Processed folder: {app.config["PROCESSED_FOLDER"]}')
+
+        # Queue interrupted jobs and start the storage janitor (only in the
+        # reloader's child when debugging)
+        if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            from app.utils import resume_interrupted_jobs
+            from app.storage import get_storage
+            get_storage().start_janitor()
+            resume_interrupted_jobs()
         
         # Run the application
         app.run(
@@ -0,0 +1,51 @@
+import cv2
+import torch
+import numpy as np
+
+class FakeBoxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = torch.tensor(xyxy, dtype=torch.float32).reshape(-1, 4)
+        self.conf = torch.tensor(conf, dtype=torch.float32)
+        self.cls = torch.tensor(cls, dtype=torch.float32)
+
+    def __getitem__(self, index):
+        boxes = FakeBoxes([], [], [])
+        boxes.xyxy, boxes.conf, boxes.cls = self.xyxy[index], self.conf[index], self.cls[index]
+        return boxes
+
+class FakeResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+    def __getitem__(self, index):
+        return FakeResult(self.boxes[index])
+
+class FakeModel:
+    """Deterministic stand-in for YOLO: boxes depend only on the frame content"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict_frame(self, frame):
+        value = int(frame.mean())
+        x = 10 + value
+        xyxy = [[x, 20, x + 60, 90], [200, 40, 260, 120], [5, 150, 40, 200]]
+        conf = [0.8, 0.3 + (value % 5) / 10, 0.9]
+        cls = [19, 18, 0]  # cow, sheep and a class that must be filtered out
+        if value % 7 == 0:
+            # A pig leaves the frame now and then
+            xyxy, conf, cls = xyxy[:1], conf[:1], cls[:1]
+        return FakeResult(FakeBoxes(xyxy, conf, cls))
+
+    def __call__(self, source, verbose=False, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        self.calls += 1
+        return [self.predict_frame(frame) for frame in frames]
+
+def make_video(path, frames=60, width=320, height=240, fps=30):
+    """Write a small synthetic video whose frames get brighter over time"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for index in range(frames):
+        writer.write(np.full((height, width, 3), index * 2, dtype=np.uint8))
+    writer.release()
+    return path
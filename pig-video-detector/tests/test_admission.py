@@ -0,0 +1,131 @@
+import unittest
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+from unittest import mock
+from app.config import Config
+from app.admission import AdmissionController, ThroughputModel, fit_line, probe_video, admit_job, job_slots
+from app.storage import StorageManager
+from app.utils import queue_job, get_job_queue, get_progress
+from tests.fakes import make_video
+
+class FixedThroughput:
+    """One second per frame, whatever the model and resolution"""
+
+    def seconds_per_frame(self, model, width, height):
+        return 1.0
+
+class TestAdmission(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.video = make_video(os.path.join(self.work_dir, 'pen1.mp4'), frames=30)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_probe(self):
+        self.assertEqual(probe_video(self.video), {'frames': 30, 'width': 320, 'height': 240, 'fps': 30})
+
+    def test_fit_line(self):
+        a, b = fit_line([(1, 3), (2, 5), (3, 7)])
+        self.assertAlmostEqual(a, 1)
+        self.assertAlmostEqual(b, 2)
+        # A single resolution scales with the pixel count
+        self.assertEqual(fit_line([(2, 4), (2, 4)]), (0.0, 2.0))
+
+    def test_throughput_from_job_stats(self):
+        stats_file = os.path.join(self.work_dir, 'job_stats.jsonl')
+        with open(stats_file, 'w') as f:
+            for resolution, fps in (('1280x720', 10), ('1920x1080', 5), ('1920x1080', 5)):
+                f.write(json.dumps({'resolution': resolution, 'fps': fps, 'model': 'yolov8x.pt'}) + '\n')
+            f.write(json.dumps({'resolution': '1920x1080', 'fps': 20, 'model': 'cascade'}) + '\n')
+            f.write('not json\n')
+
+        throughput = ThroughputModel(stats_file)
+        self.assertAlmostEqual(throughput.seconds_per_frame('yolov8x.pt', 1920, 1080), 0.2, places=2)
+        self.assertAlmostEqual(throughput.seconds_per_frame('yolov8x.pt', 1280, 720), 0.1, places=2)
+        self.assertAlmostEqual(throughput.seconds_per_frame('cascade', 1920, 1080), 0.05)
+        self.assertEqual(throughput.seconds_per_frame('yolov8s.pt', 640, 480), 1 / Config.ADMISSION_DEFAULT_FPS)
+
+    def test_eta_and_deferral(self):
+        admission = AdmissionController(slots=1, max_backlog=100, throughput=FixedThroughput())
+
+        first = admission.admit('a', self.video)
+        self.assertTrue(first['admitted'])
+        self.assertEqual(first['estimated_seconds'], 30)
+        self.assertEqual(first['eta_seconds'], 30)
+
+        # Queued behind the first job
+        admission.start('a')
+        second = admission.admit('b', self.video)
+        self.assertEqual(second['queue_position'], 0)
+        self.assertAlmostEqual(second['eta_seconds'], 60, delta=1)
+        third = admission.admit('c', self.video)
+        self.assertEqual(third['queue_position'], 1)
+        self.assertAlmostEqual(third['eta_seconds'], 90, delta=1)
+
+        deferred = admission.admit('d', self.video)
+        self.assertFalse(deferred['admitted'])
+        self.assertAlmostEqual(deferred['retry_after'], 20, delta=1)
+        self.assertTrue(admission.admit('d', self.video, force=True)['admitted'])
+
+        admission.finish('a')
+        snapshot = admission.snapshot()
+        self.assertEqual([job['job'] for job in snapshot['jobs']], ['b', 'c', 'd'])
+        self.assertEqual(snapshot['backlog_seconds'], 90)
+
+    def test_job_slots_share_the_backlog(self):
+        admission = AdmissionController(slots=2, max_backlog=0, throughput=FixedThroughput())
+        for job_id in ('a', 'b', 'c'):
+            admission.admit(job_id, self.video)
+        self.assertEqual(admission.admit('d', self.video)['eta_seconds'], 75)
+
+    def test_job_slots(self):
+        with mock.patch.object(Config, 'SCHEDULER_ENABLED', True), \
+                mock.patch.object(Config, 'SCHEDULER_MAX_JOBS', 4):
+            with mock.patch.object(Config, 'CASCADE_ENABLED', False):
+                self.assertEqual(job_slots(), 4)
+            # The cascade bypasses the scheduler, so its jobs must not overlap
+            with mock.patch.object(Config, 'CASCADE_ENABLED', True):
+                self.assertEqual(job_slots(), 1)
+
+    def test_queued_jobs_wait_for_a_slot(self):
+        """Without an inference worker jobs still run one at a time, as the ETAs assume"""
+        lock = threading.Lock()
+        running = []
+        peak = []
+        statuses = []
+
+        def fake_job(input_path, output_path):
+            with lock:
+                statuses.append(get_progress(os.path.basename(output_path))['status'])
+                running.append(output_path)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(output_path)
+
+        with mock.patch('app.utils.process_video_async', fake_job), \
+                mock.patch.object(Config, 'PROGRESS_FOLDER', os.path.join(self.work_dir, 'progress')), \
+                mock.patch('app.utils.get_storage', return_value=StorageManager(quota_mb=0, max_age_hours=0)):
+            for index in range(3):
+                queue_job(self.video, os.path.join(self.work_dir, f'processed_{index}.mp4'))
+            get_job_queue().join()
+
+        self.assertEqual(peak, [1, 1, 1])
+        # Each job has its own progress, waiting jobs report they are queued
+        self.assertEqual(statuses, ['queued'] * 3)
+
+    def test_invalid_video(self):
+        path = os.path.join(self.work_dir, 'broken.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'not a video')
+        decision = admit_job('broken', path)
+        self.assertFalse(decision['admitted'])
+        self.assertIn('error', decision)
+
+if __name__ == '__main__':
+    unittest.main()
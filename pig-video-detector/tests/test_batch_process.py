@@ -0,0 +1,102 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from unittest import mock
+from app.config import Config
+from batch_process import find_videos, main
+from tests.fakes import FakeModel, make_video
+
+class TestBatchProcess(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.archive = os.path.join(self.work_dir, 'archive')
+        for day in ('day1', 'day2'):
+            os.makedirs(os.path.join(self.archive, day))
+        self.pen1 = make_video(os.path.join(self.archive, 'day1', 'pen1.mp4'), frames=20)
+        self.pen2 = make_video(os.path.join(self.archive, 'day2', 'pen2.mp4'), frames=30)
+        with open(os.path.join(self.archive, 'day1', 'notes.txt'), 'w') as f:
+            f.write('not a video')
+
+        self.output_dir = os.path.join(self.work_dir, 'results')
+        self.model_path = os.path.join(self.work_dir, 'yolov8x.pt')
+        open(self.model_path, 'wb').close()
+
+        self.cache_folder = Config.DETECTION_CACHE_FOLDER
+        Config.DETECTION_CACHE_FOLDER = os.path.join(self.work_dir, 'detection_cache')
+
+        # Run the videos in this process with the fake model
+        self.model = FakeModel()
+        patches = [mock.patch('batch_process.init_worker'), mock.patch('app.utils.model', self.model)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        Config.DETECTION_CACHE_FOLDER = self.cache_folder
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def run_batch(self, *inputs):
+        return main([*inputs, '--output-dir', self.output_dir, '--workers', '0', '--model', self.model_path])
+
+    def read_manifest(self):
+        with open(os.path.join(self.output_dir, 'manifest.json'), 'r') as f:
+            return json.load(f)
+
+    def test_find_videos(self):
+        """Directories and globs are expanded, duplicates and other files dropped"""
+        videos = find_videos([
+            os.path.join(self.archive, 'day1'),
+            os.path.join(self.archive, '*', '*.mp4'),
+            self.pen1
+        ])
+        self.assertEqual(videos, [self.pen1, self.pen2])
+        self.assertEqual(find_videos([os.path.join(self.archive, '**', '*.mp4')]), [self.pen1, self.pen2])
+
+    def test_batch_and_rerun(self):
+        self.assertEqual(self.run_batch(os.path.join(self.archive, '*', '*.mp4')), 0)
+
+        manifest = self.read_manifest()
+        self.assertEqual(manifest[self.pen1]['status'], 'done')
+        self.assertEqual(manifest[self.pen1]['frames'], 20)
+        self.assertEqual(manifest[self.pen2]['frames'], 30)
+        self.assertEqual(self.model.calls, 50)
+
+        # Outputs are published under their final names only
+        names = sorted(os.listdir(self.output_dir))
+        for name in ('processed_pen1.mp4', 'pen1_tracks.csv', 'processed_pen2.mp4', 'pen2_tracks.csv'):
+            self.assertIn(name, names)
+        self.assertFalse([name for name in names if '.partial' in name])
+        with open(os.path.join(self.output_dir, 'pen2_tracks.csv'), 'r') as f:
+            self.assertTrue(f.readline().startswith('frame,tracker_id'))
+
+        # Running the same command again skips the finished videos
+        self.assertEqual(self.run_batch(os.path.join(self.archive, '*', '*.mp4')), 0)
+        self.assertEqual(self.model.calls, 50)
+
+    def test_failed_video_is_retried(self):
+        broken = os.path.join(self.archive, 'day2', 'broken.mp4')
+        with open(broken, 'wb') as f:
+            f.write(b'not a video')
+
+        self.assertEqual(self.run_batch(self.archive + '/day2'), 1)
+        manifest = self.read_manifest()
+        self.assertEqual(manifest[broken]['status'], 'failed')
+        self.assertEqual(manifest[self.pen2]['status'], 'done')
+
+        # Only the failed video is tried again
+        os.remove(broken)
+        make_video(broken, frames=10)
+        self.assertEqual(self.run_batch(self.archive + '/day2'), 0)
+        self.assertEqual(self.read_manifest()[broken]['frames'], 10)
+        self.assertEqual(self.model.calls, 40)
+
+    def test_duplicate_names_are_refused(self):
+        make_video(os.path.join(self.archive, 'day2', 'pen1.mp4'), frames=10)
+        self.assertEqual(self.run_batch(self.archive + '/*/*.mp4'), 1)
+        self.assertEqual(self.model.calls, 0)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'manifest.json')))
+
+if __name__ == '__main__':
+    unittest.main()
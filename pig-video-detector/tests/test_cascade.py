@@ -0,0 +1,84 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from app.config import Config
+from app.cascade import CascadeModel, boxes_agree
+from app.utils import track_video
+from tests.fakes import FakeModel, FakeResult, FakeBoxes, make_video
+
+class UnsureModel(FakeModel):
+    """Small model stand-in: confident except on frames listed in `unsure`"""
+
+    def __init__(self, unsure=(), missing=()):
+        super().__init__()
+        self.unsure = set(unsure)
+        self.missing = set(missing)
+        self.frame = 0
+
+    def predict_frame(self, frame):
+        self.frame += 1
+        if self.frame in self.missing:
+            return FakeResult(FakeBoxes([], [], []))
+        conf = 0.3 if self.frame in self.unsure else 0.9
+        return FakeResult(FakeBoxes([[10, 10, 50, 50], [100, 10, 150, 60]], [conf, conf], [19, 19]))
+
+class TestCascade(unittest.TestCase):
+    def setUp(self):
+        self.audit_interval = Config.CASCADE_AUDIT_INTERVAL
+
+    def tearDown(self):
+        Config.CASCADE_AUDIT_INTERVAL = self.audit_interval
+
+    def frame(self):
+        return np.zeros((64, 64, 3), dtype=np.uint8)
+
+    def test_escalates_only_uncertain_frames(self):
+        small, large = UnsureModel(unsure={3}, missing={6}), UnsureModel()
+        cascade = CascadeModel(small, large)
+        for _ in range(10):
+            cascade(self.frame(), verbose=False)
+
+        report = cascade.report()
+        self.assertEqual(small.calls, 10)
+        # Frame 3 is low confidence, on frame 6 both pigs disappear
+        self.assertEqual(large.calls, 2)
+        self.assertEqual(report['escalations'], 2)
+        self.assertEqual(report['reasons']['low_confidence'], 1)
+        self.assertEqual(report['reasons']['count_change'], 1)
+        self.assertAlmostEqual(report['escalation_rate'], 0.2)
+        # Too short for an audit, the report says why there is no agreement
+        self.assertIsNone(report['audit_agreement'])
+        self.assertIn('audit_skipped', report)
+
+    def test_audit_agreement(self):
+        Config.CASCADE_AUDIT_INTERVAL = 2
+        cascade = CascadeModel(UnsureModel(), UnsureModel())
+        for _ in range(8):
+            cascade(self.frame(), verbose=False)
+
+        report = cascade.report()
+        self.assertEqual(report['audited_frames'], 4)
+        self.assertEqual(report['audit_agreement'], 1.0)
+        self.assertEqual(report['estimated_agreement'], 1.0)
+
+    def test_boxes_agree(self):
+        boxes = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=float)
+        self.assertTrue(boxes_agree(boxes, boxes[::-1] + 1))
+        self.assertFalse(boxes_agree(boxes, boxes[:1]))
+        self.assertFalse(boxes_agree(boxes, boxes + 8))
+
+    def test_track_video_reports_cascade(self):
+        work_dir = tempfile.mkdtemp()
+        try:
+            source = make_video(os.path.join(work_dir, 'source.mp4'), frames=20)
+            cascade = CascadeModel(UnsureModel(unsure={5, 6}), FakeModel())
+            stats = track_video(source, tracks_path=os.path.join(work_dir, 't.csv'), model=cascade)
+            self.assertEqual(stats['cascade']['frames'], 20)
+            self.assertGreaterEqual(stats['cascade']['escalations'], 2)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    unittest.main()
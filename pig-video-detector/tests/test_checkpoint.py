@@ -0,0 +1,175 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+from app.config import Config
+from app.checkpoint import has_checkpoint, can_resume, read_state, find_interrupted_jobs
+from app.utils import track_video, tracking_settings
+from tests.fakes import FakeModel, make_video
+
+class SimulatedCrash(Exception):
+    pass
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.source = make_video(os.path.join(self.work_dir, 'source.mp4'), frames=60)
+        self.checkpoint_dir = os.path.join(self.work_dir, 'checkpoint')
+        self.interval = Config.CHECKPOINT_INTERVAL
+        self.ffmpeg_path = Config.FFMPEG_PATH
+        self.checkpoint_folder = Config.CHECKPOINT_FOLDER
+        Config.CHECKPOINT_INTERVAL = 10
+        Config.CHECKPOINT_FOLDER = os.path.join(self.work_dir, 'checkpoints')
+
+    def tearDown(self):
+        Config.CHECKPOINT_INTERVAL = self.interval
+        Config.FFMPEG_PATH = self.ffmpeg_path
+        Config.CHECKPOINT_FOLDER = self.checkpoint_folder
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def crash_at(self, frame):
+        def progress_callback(processed_frames, total_frames):
+            if processed_frames == frame:
+                raise SimulatedCrash()
+        return progress_callback
+
+    def test_resume_is_byte_identical(self):
+        """A job resumed after a crash writes the same tracks as an uninterrupted one"""
+        expected_tracks = os.path.join(self.work_dir, 'expected.csv')
+        track_video(self.source, tracks_path=expected_tracks, model=FakeModel())
+
+        tracks = os.path.join(self.work_dir, 'tracks.csv')
+        target = os.path.join(self.work_dir, 'target.mp4')
+        with self.assertRaises(SimulatedCrash):
+            track_video(
+                self.source, target, tracks, model=FakeModel(),
+                progress_callback=self.crash_at(35),
+                checkpoint_dir=self.checkpoint_dir
+            )
+        self.assertTrue(has_checkpoint(self.checkpoint_dir))
+
+        model = FakeModel()
+        stats = track_video(
+            self.source, target, tracks, model=model,
+            checkpoint_dir=self.checkpoint_dir
+        )
+
+        self.assertEqual(stats['resumed_from'], 30)
+        self.assertEqual(model.calls, 30)
+        self.assertEqual(self.read(tracks), self.read(expected_tracks))
+        self.assertFalse(os.path.exists(self.checkpoint_dir))
+
+        import supervision as sv
+        self.assertEqual(sv.VideoInfo.from_video_path(target).total_frames, 60)
+
+    def test_resume_without_ffmpeg(self):
+        """Without ffmpeg the video is not split, the part before the checkpoint is drawn from the tracks"""
+        Config.FFMPEG_PATH = 'ffmpeg-not-installed'
+        expected = os.path.join(self.work_dir, 'expected.mp4')
+        track_video(self.source, expected, model=FakeModel())
+
+        target = os.path.join(self.work_dir, 'target.mp4')
+        with self.assertRaises(SimulatedCrash):
+            track_video(
+                self.source, target, model=FakeModel(),
+                progress_callback=self.crash_at(35),
+                checkpoint_dir=self.checkpoint_dir
+            )
+        self.assertEqual(sorted(os.listdir(self.checkpoint_dir)), ['state.pkl', 'tracks.csv'])
+
+        model = FakeModel()
+        stats = track_video(self.source, target, model=model, checkpoint_dir=self.checkpoint_dir)
+
+        self.assertEqual(stats['resumed_from'], 30)
+        self.assertEqual(model.calls, 30)
+        self.assertEqual(self.read(target), self.read(expected))
+        self.assertFalse(os.path.exists(self.checkpoint_dir))
+
+    def test_checkpoint_of_other_video_is_ignored(self):
+        tracks = os.path.join(self.work_dir, 'tracks.csv')
+        with self.assertRaises(SimulatedCrash):
+            track_video(
+                self.source, tracks_path=tracks, model=FakeModel(),
+                progress_callback=self.crash_at(25),
+                checkpoint_dir=self.checkpoint_dir
+            )
+
+        other = make_video(os.path.join(self.work_dir, 'other.mp4'), frames=40)
+        stats = track_video(
+            other, tracks_path=tracks, model=FakeModel(),
+            checkpoint_dir=self.checkpoint_dir
+        )
+        self.assertEqual(stats['resumed_from'], 0)
+        self.assertEqual(stats['frames'], 40)
+
+    def test_checkpoint_of_other_settings_is_ignored(self):
+        """Resuming with another confidence would mix two filters in one track file"""
+        tracks = os.path.join(self.work_dir, 'tracks.csv')
+        with self.assertRaises(SimulatedCrash):
+            track_video(
+                self.source, tracks_path=tracks, model=FakeModel(),
+                progress_callback=self.crash_at(25),
+                checkpoint_dir=self.checkpoint_dir
+            )
+
+        stats = track_video(
+            self.source, tracks_path=tracks, model=FakeModel(),
+            checkpoint_dir=self.checkpoint_dir,
+            settings=tracking_settings(model_confidence=0.5)
+        )
+        self.assertEqual(stats['resumed_from'], 0)
+
+    def test_attempts_are_limited(self):
+        """Every run from the checkpoint counts, the job is given up after CHECKPOINT_MAX_ATTEMPTS"""
+        target = os.path.join(self.work_dir, 'target.mp4')
+        for attempt, frame in enumerate((25, 35, 45), start=1):
+            with self.assertRaises(SimulatedCrash):
+                track_video(
+                    self.source, target, model=FakeModel(),
+                    progress_callback=self.crash_at(frame),
+                    checkpoint_dir=self.checkpoint_dir
+                )
+            self.assertEqual(read_state(self.checkpoint_dir)['attempts'], attempt)
+            self.assertEqual(can_resume(self.checkpoint_dir), attempt < Config.CHECKPOINT_MAX_ATTEMPTS)
+
+    def crashed_job(self, name):
+        """Leave the checkpoint of a web job interrupted at frame 25"""
+        source = make_video(os.path.join(self.work_dir, f'{name}.mp4'), frames=40)
+        target = os.path.join(self.work_dir, f'processed_{name}.mp4')
+        checkpoint_dir = os.path.join(Config.CHECKPOINT_FOLDER, f'processed_{name}.mp4')
+        with self.assertRaises(SimulatedCrash):
+            track_video(
+                source, target, model=FakeModel(),
+                progress_callback=self.crash_at(25),
+                checkpoint_dir=checkpoint_dir
+            )
+        return source, target, checkpoint_dir
+
+    def test_find_interrupted_jobs(self):
+        pending = self.crashed_job('pen1')
+
+        # Its upload was evicted
+        source, _, gone = self.crashed_job('pen2')
+        os.remove(source)
+
+        # Failed too many times
+        _, _, exhausted = self.crashed_job('pen3')
+        state = read_state(exhausted)
+        state['attempts'] = Config.CHECKPOINT_MAX_ATTEMPTS
+        with open(os.path.join(exhausted, 'state.pkl'), 'wb') as f:
+            pickle.dump(state, f)
+
+        # Stopped before its first checkpoint
+        no_state = os.path.join(Config.CHECKPOINT_FOLDER, 'processed_pen4.mp4')
+        os.makedirs(no_state)
+
+        self.assertEqual(find_interrupted_jobs(), [pending[:2]])
+        self.assertEqual(os.listdir(Config.CHECKPOINT_FOLDER), ['processed_pen1.mp4'])
+
+if __name__ == '__main__':
+    unittest.main()
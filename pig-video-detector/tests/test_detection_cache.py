@@ -0,0 +1,95 @@
+import unittest
+import os
+import csv
+import shutil
+import tempfile
+from app import create_app
+from app.config import Config
+from app.detection_cache import DetectionCache, get_cache_dir, get_cache_key, list_caches
+from app.utils import track_video, retrack_video, get_retrack_queue
+from tests.fakes import FakeModel, make_video
+
+class TestDetectionCache(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.cache_folder = Config.DETECTION_CACHE_FOLDER
+        Config.DETECTION_CACHE_FOLDER = os.path.join(self.work_dir, 'cache')
+
+        self.source = make_video(os.path.join(self.work_dir, 'source.mp4'), frames=40)
+        self.cache_key = get_cache_key(self.source)
+        self.tracks = os.path.join(self.work_dir, 'tracks.csv')
+        track_video(
+            self.source, tracks_path=self.tracks, model=FakeModel(),
+            cache_dir=get_cache_dir(self.cache_key)
+        )
+
+    def tearDown(self):
+        Config.DETECTION_CACHE_FOLDER = self.cache_folder
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_cache_contents(self):
+        cache = DetectionCache(get_cache_dir(self.cache_key))
+        self.assertEqual(cache.frames, 40)
+        self.assertEqual([c['key'] for c in list_caches()], [self.cache_key])
+
+        # Unfiltered: the class that the tracker ignores is cached too
+        classes = set()
+        for index in range(cache.frames):
+            xyxy, confidence, class_id = cache.frame(index)
+            self.assertEqual(xyxy.shape, (len(confidence), 4))
+            classes.update(class_id.tolist())
+        self.assertEqual(classes, {0, 18, 19})
+
+    def test_retrack_same_settings_is_identical(self):
+        retracked = os.path.join(self.work_dir, 'retracked.csv')
+        stats = retrack_video(self.cache_key, tracks_path=retracked)
+        self.assertEqual(stats['frames'], 40)
+        self.assertEqual(self.read(retracked), self.read(self.tracks))
+
+    def test_retrack_new_settings(self):
+        retracked = os.path.join(self.work_dir, 'retracked.csv')
+        retrack_video(self.cache_key, tracks_path=retracked, selected_classes=[19])
+        with open(retracked, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertTrue(rows)
+        self.assertEqual({row['class_id'] for row in rows}, {'19'})
+
+    def test_retrack_render_needs_source(self):
+        with self.assertRaises(ValueError):
+            retrack_video(self.cache_key, target_path=os.path.join(self.work_dir, 'x.mp4'))
+
+    def test_retrack_endpoint(self):
+        processed_folder = Config.PROCESSED_FOLDER
+        progress_folder = Config.PROGRESS_FOLDER
+        Config.PROCESSED_FOLDER = self.work_dir
+        Config.PROGRESS_FOLDER = os.path.join(self.work_dir, 'progress')
+        try:
+            client = create_app().test_client()
+            response = client.post(f'/retrack/{self.cache_key}', json={'track_thresh': 0.5})
+            self.assertEqual(response.status_code, 202)
+            job = response.get_json()
+
+            # The re-track runs in the background, the page polls its progress
+            get_retrack_queue().join()
+            self.assertEqual(client.get(job['progress']).get_json()['status'], 'done')
+            response = client.get(job['tracks'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'text/csv')
+            self.assertTrue(response.data.startswith(b'frame,tracker_id'))
+            response.close()
+
+            response = client.post('/retrack/missing', json={})
+            self.assertEqual(response.status_code, 404)
+
+            response = client.post(f'/retrack/{self.cache_key}', json={'track_buffer': 'x'})
+            self.assertEqual(response.status_code, 400)
+        finally:
+            Config.PROCESSED_FOLDER = processed_folder
+            Config.PROGRESS_FOLDER = progress_folder
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+from app.config import Config
+from app.encoder import FFmpegVideoSink, ffmpeg_available, output_size
+from app.utils import track_video
+from tests.fakes import FakeModel, make_video
+
+class TestEncoder(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_output_size(self):
+        self.assertEqual(output_size(1920, 1080, 0), (1920, 1080))
+        self.assertEqual(output_size(1920, 1080, 1280), (1280, 720))
+        self.assertEqual(output_size(640, 480, 1280), (640, 480))
+        self.assertEqual(output_size(1281, 721, 0), (1280, 720))
+
+    @unittest.skipUnless(ffmpeg_available(), 'ffmpeg no está instalado')
+    def test_encode_and_downscale(self):
+        """Encoded output is H.264, downscaled, and stats are recorded"""
+        import supervision as sv
+
+        source = make_video(os.path.join(self.work_dir, 'source.mp4'), frames=45, width=640, height=360)
+        target = os.path.join(self.work_dir, 'target.mp4')
+        video_info = sv.VideoInfo.from_video_path(source)
+
+        with FFmpegVideoSink(target, video_info, max_width=320, queue_size=4) as sink:
+            for frame in sv.get_video_frames_generator(source):
+                sink.write_frame(frame)
+
+        output_info = sv.VideoInfo.from_video_path(target)
+        self.assertEqual((output_info.width, output_info.height), (320, 180))
+        self.assertEqual(output_info.total_frames, 45)
+        self.assertEqual(sink.stats['frames'], 45)
+        self.assertEqual(sink.stats['bytes'], os.path.getsize(target))
+        self.assertGreater(sink.stats['encode_cpu_seconds'], 0)
+
+    @unittest.skipUnless(ffmpeg_available(), 'ffmpeg no está instalado')
+    def test_without_wait4(self):
+        """Where os.wait4 is missing (Windows) the job still runs, CPU time is unknown"""
+        source = make_video(os.path.join(self.work_dir, 'source.mp4'), frames=30)
+        target = os.path.join(self.work_dir, 'target.mp4')
+        with mock.patch('app.encoder.CAN_MEASURE_CPU', False):
+            stats = track_video(source, target, model=FakeModel())
+        self.assertIsNone(stats['encode_cpu_seconds'])
+        self.assertEqual(stats['video_bytes'], os.path.getsize(target))
+
+    @unittest.skipUnless(ffmpeg_available(), 'ffmpeg no está instalado')
+    def test_track_video_reports_encoding_stats(self):
+        """Benchmark: file size and encoding CPU for a few CRF values"""
+        source = make_video(os.path.join(self.work_dir, 'source.mp4'), frames=90)
+        crf = Config.VIDEO_CRF
+
+        print(f"\nCodificación ({Config.VIDEO_CODEC}, preset {Config.VIDEO_PRESET}):")
+        try:
+            for value in (18, 23, 28):
+                Config.VIDEO_CRF = value
+                target = os.path.join(self.work_dir, f'crf{value}.mp4')
+                stats = track_video(source, target, model=FakeModel())
+                print(
+                    f"- CRF {value}: {stats['video_bytes'] / 1024:.1f} KB, "
+                    f"CPU {stats['encode_cpu_seconds']:.2f}s, "
+                    f"bloqueado {stats['blocked_seconds']:.2f}s"
+                )
+                self.assertEqual(stats['video_bytes'], os.path.getsize(target))
+        finally:
+            Config.VIDEO_CRF = crf
+
+    def test_ffmpeg_failure_is_reported(self):
+        """A broken encoder command raises instead of silently writing nothing"""
+        import supervision as sv
+
+        source = make_video(os.path.join(self.work_dir, 'source.mp4'), frames=5)
+        video_info = sv.VideoInfo.from_video_path(source)
+        ffmpeg_path = Config.FFMPEG_PATH
+        Config.FFMPEG_PATH = 'false'
+        try:
+            with self.assertRaises(RuntimeError):
+                with FFmpegVideoSink(os.path.join(self.work_dir, 'x.mp4'), video_info) as sink:
+                    for frame in sv.get_video_frames_generator(source):
+                        sink.write_frame(frame)
+        finally:
+            Config.FFMPEG_PATH = ffmpeg_path
+
+if __name__ == '__main__':
+    unittest.main()
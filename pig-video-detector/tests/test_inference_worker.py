@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import time
+import atexit
+import subprocess
+from app.config import Config
+from app.inference_worker import start_inference_server, stop_inference_server, send_request, get_rss_mb
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(__file__))
+
+class TestInferenceWorker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start a private inference worker for the benchmark"""
+        if not os.path.exists(Config.MODEL_PATH):
+            raise unittest.SkipTest(f"Modelo no encontrado en: {Config.MODEL_PATH}")
+
+        cls.address = os.path.join(PROJECT_DIR, 'test-inference.sock')
+        cls.authkey = b'test-key'
+        cls.process = start_inference_server(cls.address, cls.authkey)
+
+        # Esperar a que el modelo termine de cargar
+        deadline = time.time() + 300
+        while not os.path.exists(cls.address):
+            if time.time() > deadline or cls.process.poll() is not None:
+                raise RuntimeError('Inference worker did not start')
+            time.sleep(0.5)
+
+    @classmethod
+    def tearDownClass(cls):
+        stop_inference_server(cls.process)
+        if os.path.exists(cls.address):
+            os.remove(cls.address)
+
+    def http_worker_rss(self):
+        """Measure the RSS of a fresh process that only builds the Flask app"""
+        code = (
+            "from app import create_app; "
+            "from app.inference_worker import get_rss_mb; "
+            "create_app(); print(get_rss_mb())"
+        )
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=PROJECT_DIR)
+        return float(output.decode().strip().splitlines()[-1])
+
+    def test_ping(self):
+        """The worker answers with its own pid"""
+        reply = send_request({'action': 'ping'}, self.address, self.authkey)
+        self.assertTrue(reply['ok'])
+        self.assertEqual(reply['pid'], self.process.pid)
+
+    def test_survives_http_worker_exit(self):
+        """A forked HTTP worker that exits must leave the inference worker running"""
+        pid = os.fork()
+        if pid == 0:
+            # What a gunicorn worker runs on its way out
+            atexit._run_exitfuncs()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        time.sleep(1)
+
+        self.assertIsNone(self.process.poll())
+        self.assertTrue(send_request({'action': 'ping'}, self.address, self.authkey)['ok'])
+
+    def test_unknown_action(self):
+        reply = send_request({'action': 'nope'}, self.address, self.authkey)
+        self.assertFalse(reply['ok'])
+
+    def test_memory_footprint(self):
+        """Benchmark: HTTP workers must not carry a copy of the model"""
+        inference_rss = send_request({'action': 'ping'}, self.address, self.authkey)['rss_mb']
+        http_rss = self.http_worker_rss()
+        model_mb = os.path.getsize(Config.MODEL_PATH) / (1024 * 1024)
+
+        print(f"\nMemoria por proceso:")
+        print(f"- Inference worker: {inference_rss:.1f} MB")
+        print(f"- HTTP worker: {http_rss:.1f} MB")
+        print(f"- Proceso de pruebas: {get_rss_mb():.1f} MB")
+        print(f"- Pesos del modelo: {model_mb:.1f} MB")
+
+        self.assertGreater(inference_rss, http_rss)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import os
+import shutil
+import tempfile
+from app.config import Config
+from app.encoder import ffmpeg_available
+from app.storage import get_storage
+from app.preview import PreviewLane, sample_times, sample_frames, get_preview_dir, read_status, write_status
+from tests.fakes import FakeModel, make_video
+
+class TestPreview(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.preview_folder = Config.PREVIEW_FOLDER
+        self.ffmpeg_path = Config.FFMPEG_PATH
+        Config.PREVIEW_FOLDER = os.path.join(self.work_dir, 'previews')
+        self.video = make_video(os.path.join(self.work_dir, 'pen1.mp4'), frames=90, width=640, height=480)
+
+    def tearDown(self):
+        Config.PREVIEW_FOLDER = self.preview_folder
+        Config.FFMPEG_PATH = self.ffmpeg_path
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_sample_times(self):
+        self.assertEqual(sample_times(6, 3), [1, 3, 5])
+
+    @unittest.skipUnless(ffmpeg_available(), 'ffmpeg no está instalado')
+    def test_keyframes_with_ffmpeg(self):
+        frames = sample_frames(self.video, count=4, max_width=320)
+        self.assertEqual(len(frames), 4)
+        for _, frame in frames:
+            self.assertEqual(frame.shape, (240, 320, 3))
+
+    def test_frames_with_opencv(self):
+        Config.FFMPEG_PATH = 'ffmpeg-not-installed'
+        frames = sample_frames(self.video, count=3, max_width=320)
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(frames[0][1].shape, (240, 320, 3))
+        # Later samples come from later (brighter) frames
+        self.assertLess(frames[0][1].mean(), frames[-1][1].mean())
+
+    def test_preview_lane(self):
+        model = FakeModel()
+        lane = PreviewLane(model=model).start()
+        self.assertTrue(lane.submit('pen1', self.video))
+        lane.requests.join()
+
+        preview = read_status(get_preview_dir('pen1'))
+        self.assertEqual(preview['status'], 'ready')
+        self.assertEqual(len(preview['thumbnails']), Config.PREVIEW_FRAMES)
+        # FakeModel finds two animals, one when a pig leaves the frame
+        self.assertIn(preview['count'], (1, 2))
+        for thumbnail in preview['thumbnails']:
+            self.assertTrue(os.path.exists(os.path.join(get_preview_dir('pen1'), thumbnail['name'])))
+        # All sampled frames go to the model in a single batch
+        self.assertEqual(model.calls, 1)
+
+    def test_preview_error(self):
+        lane = PreviewLane(model=FakeModel()).start()
+        missing = os.path.join(self.work_dir, 'missing.mp4')
+        lane.submit('missing', missing)
+        lane.requests.join()
+        self.assertEqual(read_status(get_preview_dir('missing'))['status'], 'error')
+        # Indexed like a ready preview, so the janitor removes it in time
+        self.assertIn(os.path.abspath(get_preview_dir('missing')), get_storage().artifacts)
+        get_storage().discard(get_preview_dir('missing'))
+
+    def test_source_outlives_its_job(self):
+        """A job that finishes before its preview runs leaves the upload to the preview"""
+        lane = PreviewLane(model=FakeModel())
+        self.assertTrue(lane.submit('pen1', self.video))
+        get_storage().remove_when_unpinned(self.video)
+        self.assertTrue(os.path.exists(self.video))
+
+        lane.start()
+        lane.requests.join()
+        self.assertEqual(read_status(get_preview_dir('pen1'))['status'], 'ready')
+        self.assertFalse(os.path.exists(self.video))
+
+    def test_full_lane_keeps_old_preview(self):
+        write_status(get_preview_dir('pen2'), 'ready', count=2)
+
+        # Not started, so the single slot stays taken
+        lane = PreviewLane(model=FakeModel(), queue_size=1)
+        self.assertTrue(lane.submit('pen1', self.video))
+        self.assertFalse(lane.submit('pen2', self.video))
+
+        # The skipped request leaves the previous preview in place
+        self.assertEqual(read_status(get_preview_dir('pen2'))['status'], 'ready')
+        self.assertEqual(read_status(get_preview_dir('pen1'))['status'], 'pending')
+        get_storage().unpin(self.video)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+from app import create_app
+from app.config import Config
+from app.utils import save_progress
+
+ADMITTED = {'admitted': True, 'queue_position': 0, 'eta_seconds': 1, 'estimated_seconds': 1}
+DEFERRED = {'admitted': False, 'retry_after': 60, 'estimated_seconds': 1}
+
+class TestRoutes(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        folders = {
+            'UPLOAD_FOLDER': 'uploads',
+            'PROCESSED_FOLDER': 'processed',
+            'CHECKPOINT_FOLDER': 'checkpoints',
+            'DETECTION_CACHE_FOLDER': 'detection_cache',
+            'PREVIEW_FOLDER': 'previews',
+            'PROGRESS_FOLDER': 'progress'
+        }
+        self.patches = [
+            mock.patch.object(Config, name, os.path.join(self.work_dir, folder))
+            for name, folder in folders.items()
+        ]
+        self.patches += [
+            mock.patch.object(Config, 'INFERENCE_ADDRESS', ''),
+            mock.patch('app.routes.submit_preview', return_value=False)
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.client = create_app().test_client()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def upload(self, name='pen.mp4'):
+        return self.client.post('/upload', data={'video': (io.BytesIO(b'video'), name)})
+
+    def test_same_name_uploads_do_not_collide(self):
+        with mock.patch('app.routes.admit_job', return_value=ADMITTED), \
+                mock.patch('app.routes.queue_job') as queue_job:
+            first = self.upload().get_json()
+            second = self.upload().get_json()
+        self.assertNotEqual(first['processed_video'], second['processed_video'])
+        self.assertTrue(first['progress'].startswith('/progress/processed_'))
+
+        inputs = [call.args[0] for call in queue_job.call_args_list]
+        self.assertEqual(len(set(inputs)), 2)
+
+        # A deferred re-upload only removes its own file
+        with mock.patch('app.routes.admit_job', return_value=DEFERRED):
+            self.assertEqual(self.upload().status_code, 429)
+        for path in inputs:
+            self.assertTrue(os.path.exists(path))
+
+    def test_progress_per_job(self):
+        self.assertEqual(self.client.get('/progress/processed_pen.mp4').status_code, 404)
+
+        save_progress('processed_pen.mp4', 40)
+        save_progress('processed_pen2.mp4', 0, 'queued')
+        self.assertEqual(
+            self.client.get('/progress/processed_pen.mp4').get_json(),
+            {'progress': 40, 'status': 'running'}
+        )
+        self.assertEqual(self.client.get('/progress/processed_pen2.mp4').get_json()['status'], 'queued')
+
+if __name__ == '__main__':
+    unittest.main()
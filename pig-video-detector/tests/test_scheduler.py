@@ -0,0 +1,167 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+import threading
+import numpy as np
+from app.scheduler import InferenceScheduler
+from app.utils import track_video
+from tests.fakes import FakeModel, make_video
+
+class SlowModel(FakeModel):
+    """FakeModel with a fixed cost per call plus a smaller cost per frame, like a real batch"""
+
+    def __init__(self, call_seconds=0.015, frame_seconds=0.002):
+        super().__init__()
+        self.call_seconds = call_seconds
+        self.frame_seconds = frame_seconds
+        self.batch_sizes = []
+        self.lock = threading.Lock()
+
+    def __call__(self, source, verbose=False, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        # A single model can only run one call at a time
+        with self.lock:
+            time.sleep(self.call_seconds + self.frame_seconds * len(frames))
+            self.batch_sizes.append(len(frames))
+            return super().__call__(frames, verbose=verbose, **kwargs)
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def frame(self, value):
+        return np.full((64, 64, 3), value, dtype=np.uint8)
+
+    def test_batches_frames_of_concurrent_jobs(self):
+        model = SlowModel()
+        scheduler = InferenceScheduler(model, max_batch=4, max_wait_ms=50).start()
+        results = {}
+
+        def job(name):
+            with scheduler.register(name) as client:
+                results[name] = [
+                    client(self.frame(value), verbose=False, conf=0.25)[0].boxes.conf.tolist()
+                    for value in range(10)
+                ]
+
+        threads = [threading.Thread(target=job, args=(f'job{i}',)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        scheduler.stop()
+
+        # Every job gets the same results as calling the model directly
+        expected = [FakeModel().predict_frame(self.frame(value)).boxes.conf.tolist() for value in range(10)]
+        for name in results:
+            self.assertEqual(results[name], expected)
+        self.assertGreater(max(model.batch_sizes), 1)
+        self.assertEqual(scheduler.report()['frames'], 40)
+
+    def test_per_job_confidence(self):
+        scheduler = InferenceScheduler(FakeModel(), max_batch=2, max_wait_ms=50).start()
+        low, high = scheduler.register('low'), scheduler.register('high')
+        replies = {}
+
+        def call(name, client, conf):
+            replies[name] = client(self.frame(3), verbose=False, conf=conf)[0]
+
+        threads = [
+            threading.Thread(target=call, args=('low', low, 0.25)),
+            threading.Thread(target=call, args=('high', high, 0.7))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        scheduler.stop()
+
+        self.assertEqual(len(replies['low'].boxes.conf), 3)
+        self.assertTrue(bool((replies['high'].boxes.conf >= 0.7).all()))
+        self.assertEqual(len(replies['high'].boxes.conf), 2)
+
+    def test_fair_selection(self):
+        """A job with a backlog does not keep the others out of the batch"""
+        scheduler = InferenceScheduler(FakeModel(), max_batch=4)
+        scheduler.running = True
+        busy, quiet = scheduler.register('busy', slo_ms=100), scheduler.register('quiet', slo_ms=5000)
+        for value in range(8):
+            scheduler.submit(busy, self.frame(value), 0.25)
+        scheduler.submit(quiet, self.frame(0), 0.25)
+
+        batch = scheduler._select()
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(sum(request.client is quiet for request in batch), 1)
+        # Earliest deadline first within a round
+        self.assertIs(batch[0].client, busy)
+
+    def test_track_video_through_scheduler(self):
+        source = make_video(os.path.join(self.work_dir, 'source.mp4'), frames=30)
+        direct_tracks = os.path.join(self.work_dir, 'direct.csv')
+        track_video(source, tracks_path=direct_tracks, model=FakeModel())
+
+        scheduler = InferenceScheduler(FakeModel(), max_batch=4).start()
+        tracks = [os.path.join(self.work_dir, f'job{i}.csv') for i in range(3)]
+        stats = {}
+
+        def job(path):
+            with scheduler.register(path) as client:
+                stats[path] = track_video(source, tracks_path=path, model=client)
+
+        threads = [threading.Thread(target=job, args=(path,)) for path in tracks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        scheduler.stop()
+
+        # Each job keeps its own tracker, so track ids match a run on its own
+        with open(direct_tracks) as f:
+            expected = f.read()
+        for path in tracks:
+            with open(path) as f:
+                self.assertEqual(f.read(), expected)
+            self.assertEqual(stats[path]['scheduler']['frames'], 30)
+
+    def test_benchmark_concurrent_jobs(self):
+        """Benchmark: aggregate throughput with 1-8 concurrent jobs, batched vs one call per frame"""
+        frames = 20
+        print("\nThroughput agregado (frames/s):")
+        for jobs in (1, 2, 4, 8):
+            results = {}
+            for batched in (False, True):
+                model = SlowModel()
+                scheduler = InferenceScheduler(model, max_batch=8).start() if batched else None
+
+                def job():
+                    client = scheduler.register('job') if batched else model
+                    for value in range(frames):
+                        client(self.frame(value), verbose=False, conf=0.25)
+                    if batched:
+                        client.close()
+
+                start_time = time.time()
+                threads = [threading.Thread(target=job) for _ in range(jobs)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                results[batched] = jobs * frames / (time.time() - start_time)
+                if batched:
+                    scheduler.stop()
+                    mean_batch = scheduler.report()['mean_batch_size']
+
+            print(
+                f"- {jobs} trabajos: sin batching {results[False]:.1f}, "
+                f"con batching {results[True]:.1f} (batch medio {mean_batch:.1f})"
+            )
+            if jobs >= 4:
+                self.assertGreater(results[True], results[False] * 1.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import os
+import sys
+import time
+import subprocess
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# Modules that must only be imported by the processing path
+HEAVY_MODULES = ['torch', 'ultralytics', 'supervision', 'cv2', 'numpy']
+
+STARTUP_CODE = (
+    "from app import create_app; "
+    "from app.inference_worker import get_rss_mb; "
+    "app = create_app(); "
+    "client = app.test_client(); "
+    "client.get('/'); client.get('/progress/processed_pen1.mp4'); client.post('/retrack/missing', json={}); "
+    "print(get_rss_mb())"
+)
+
+def parse_importtime(stderr):
+    """Parse `python -X importtime` output into {module: (self_us, cumulative_us)}"""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = (int(self_us), int(cumulative_us))
+    return imports
+
+class TestStartup(unittest.TestCase):
+    def run_startup(self, *args):
+        """Build the app in a fresh interpreter and serve the light pages"""
+        start_time = time.time()
+        result = subprocess.run(
+            [sys.executable, *args, '-c', STARTUP_CODE],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        elapsed = time.time() - start_time
+        rss_mb = float(result.stdout.strip().splitlines()[-1])
+        return elapsed, rss_mb, result.stderr
+
+    def test_no_heavy_imports(self):
+        """Serving index and progress must not import the ML stack"""
+        _, _, stderr = self.run_startup('-X', 'importtime')
+        imports = parse_importtime(stderr)
+
+        loaded = [name for name in HEAVY_MODULES if name in imports]
+        self.assertEqual(loaded, [], f"Heavy modules imported at startup: {loaded}")
+
+    def test_startup_benchmark(self):
+        """Benchmark: startup time, RSS and import cost of an HTTP worker"""
+        elapsed, rss_mb, stderr = self.run_startup('-X', 'importtime')
+        imports = parse_importtime(stderr)
+
+        # Only top-level packages, sorted by cumulative import time
+        top_level = {name: times for name, times in imports.items() if '.' not in name}
+        slowest = sorted(top_level.items(), key=lambda item: item[1][1], reverse=True)[:10]
+        total_ms = sum(times[0] for times in imports.values()) / 1000
+
+        print(f"\nArranque de un worker HTTP:")
+        print(f"- Tiempo total: {elapsed:.2f}s")
+        print(f"- Memoria (RSS): {rss_mb:.1f} MB")
+        print(f"- Tiempo de imports: {total_ms:.1f} ms ({len(imports)} módulos)")
+        for name, (_, cumulative_us) in slowest:
+            print(f"  {name}: {cumulative_us / 1000:.1f} ms")
+
+        self.assertLess(rss_mb, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+from app.config import Config
+from app.storage import StorageManager
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.folders = (
+            Config.UPLOAD_FOLDER, Config.PROCESSED_FOLDER, Config.DETECTION_CACHE_FOLDER,
+            Config.PREVIEW_FOLDER, Config.CHECKPOINT_FOLDER
+        )
+        Config.UPLOAD_FOLDER = os.path.join(self.work_dir, 'uploads')
+        Config.PROCESSED_FOLDER = os.path.join(self.work_dir, 'processed')
+        Config.DETECTION_CACHE_FOLDER = os.path.join(self.work_dir, 'detection_cache')
+        Config.PREVIEW_FOLDER = os.path.join(self.work_dir, 'previews')
+        Config.CHECKPOINT_FOLDER = os.path.join(self.work_dir, 'checkpoints')
+        for folder in (Config.UPLOAD_FOLDER, Config.PROCESSED_FOLDER, Config.DETECTION_CACHE_FOLDER):
+            os.makedirs(folder)
+
+    def tearDown(self):
+        (
+            Config.UPLOAD_FOLDER, Config.PROCESSED_FOLDER, Config.DETECTION_CACHE_FOLDER,
+            Config.PREVIEW_FOLDER, Config.CHECKPOINT_FOLDER
+        ) = self.folders
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def write(self, folder, name, size_kb):
+        path = os.path.join(folder, name)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * size_kb * 1024)
+        return path
+
+    def test_lru_eviction_under_quota(self):
+        storage = StorageManager(quota_mb=1, max_age_hours=0)
+        paths = [self.write(Config.PROCESSED_FOLDER, f'video{i}.mp4', 300) for i in range(5)]
+        now = time.time()
+        for age, path in enumerate(reversed(paths)):
+            storage.add(path, 'output', last_access=now - age)
+
+        # Using the oldest file makes it the most recent one
+        storage.touch(paths[0])
+        evicted = storage.enforce()
+
+        self.assertEqual(evicted, [os.path.abspath(paths[1]), os.path.abspath(paths[2])])
+        self.assertLessEqual(storage.total_bytes, 1024 * 1024)
+        self.assertTrue(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(paths[1]))
+
+    def test_pinned_files_are_kept(self):
+        storage = StorageManager(quota_mb=1, max_age_hours=0)
+        upload = self.write(Config.UPLOAD_FOLDER, 'pen1.mp4', 700)
+        output = self.write(Config.PROCESSED_FOLDER, 'processed_pen0.mp4', 700)
+        storage.add(upload, 'upload', last_access=time.time() - 10)
+        storage.add(output, 'output')
+
+        with storage.pinned(upload):
+            self.assertEqual(storage.enforce(), [os.path.abspath(output)])
+            self.assertTrue(os.path.exists(upload))
+
+        # Unpinning counts as a use
+        self.assertEqual(storage.enforce(), [])
+
+    def test_remove_when_unpinned(self):
+        storage = StorageManager(quota_mb=0, max_age_hours=0)
+        upload = self.write(Config.UPLOAD_FOLDER, 'pen1.mp4', 1)
+        storage.add(upload, 'upload')
+
+        storage.pin(upload)
+        storage.pin(upload)
+        self.assertFalse(storage.remove_when_unpinned(upload))
+        storage.unpin(upload)
+        self.assertTrue(os.path.exists(upload))
+        # The last pin deletes it
+        storage.unpin(upload)
+        self.assertFalse(os.path.exists(upload))
+        self.assertEqual(storage.total_bytes, 0)
+
+        other = self.write(Config.UPLOAD_FOLDER, 'pen2.mp4', 1)
+        self.assertTrue(storage.remove_when_unpinned(other))
+        self.assertFalse(os.path.exists(other))
+
+    def test_max_age(self):
+        storage = StorageManager(quota_mb=0, max_age_hours=1)
+        old = self.write(Config.PROCESSED_FOLDER, 'old.mp4', 1)
+        new = self.write(Config.PROCESSED_FOLDER, 'new.mp4', 1)
+        storage.add(old, 'output', last_access=time.time() - 7200)
+        storage.add(new, 'output')
+
+        self.assertEqual(storage.enforce(), [os.path.abspath(old)])
+        self.assertEqual(storage.enforce(max_age_hours=0), [])
+
+    def test_scan_indexes_existing_files(self):
+        self.write(Config.UPLOAD_FOLDER, 'pen1.mp4', 10)
+        self.write(Config.PROCESSED_FOLDER, 'processed_pen1.mp4', 20)
+        self.write(Config.PROCESSED_FOLDER, 'pen1_tracks.csv', 1)
+        cache_dir = os.path.join(Config.DETECTION_CACHE_FOLDER, 'abc_yolov8x')
+        os.makedirs(cache_dir)
+        self.write(cache_dir, 'boxes.f32', 5)
+        os.makedirs(f'{cache_dir}.partial')
+        checkpoint_dir = os.path.join(Config.CHECKPOINT_FOLDER, 'processed_pen2.mp4')
+        os.makedirs(checkpoint_dir)
+        self.write(checkpoint_dir, 'state.pkl', 2)
+
+        storage = StorageManager(quota_mb=0, max_age_hours=0)
+        storage.scan()
+        usage = storage.usage()
+
+        self.assertEqual(usage['artifacts'], 5)
+        self.assertEqual(usage['upload_bytes'], 10 * 1024)
+        self.assertEqual(usage['output_bytes'], 20 * 1024)
+        self.assertEqual(usage['tracks_bytes'], 1024)
+        self.assertEqual(usage['cache_bytes'], 5 * 1024)
+        self.assertEqual(usage['checkpoint_bytes'], 2 * 1024)
+
+        # Whole cache and checkpoint folders are evicted
+        storage.quota = 1
+        self.assertEqual(len(storage.enforce()), 5)
+        self.assertFalse(os.path.exists(cache_dir))
+        self.assertFalse(os.path.exists(checkpoint_dir))
+        self.assertEqual(storage.total_bytes, 0)
+
+    def test_stale_heap_entries_are_compacted(self):
+        storage = StorageManager(quota_mb=0, max_age_hours=0)
+        path = self.write(Config.PROCESSED_FOLDER, 'video.mp4', 1)
+        storage.add(path, 'output')
+        for _ in range(1000):
+            storage.touch(path)
+        self.assertLess(len(storage.heap), 100)
+
+if __name__ == '__main__':
+    unittest.main()
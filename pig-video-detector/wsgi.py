@@ -0,0 +1,5 @@
+#!/usr/bin/env python3
+"""WSGI entry point for production servers (see gunicorn.conf.py)"""
+from app import create_app
+
+app = create_app()